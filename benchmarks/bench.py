@@ -0,0 +1,251 @@
+"""
+Micro-benchmarks for the code in src/ that runs on every packet or frame.
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.2
+
+With --baseline the run fails if any benchmark's ops/sec dropped by more than
+--threshold compared to the saved baseline.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from audio import CARD_SAMPLE_RATE, RxConverter, TxConverter  # noqa: E402
+from kv4p import (  # noqa: E402
+    AUDIO_FRAME_SIZE,
+    AUDIO_SAMPLE_RATE,
+    COMMAND_HEADER,
+    FRAME_AUDIO,
+    FRAME_HEADER,
+    CommandEncoder,
+    Kv4pHTDevice,
+    encode_filters,
+    encode_tune_to,
+    sliced,
+)
+
+PAYLOAD_SIZES = [32, 512, 4096]
+MTUS = [23, 185, 247, 512]
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return register
+
+
+def audio_frame(size: int) -> bytes:
+    payload = bytes(i & 0xFF for i in range(size))
+    return bytes(COMMAND_HEADER) + FRAME_HEADER.pack(FRAME_AUDIO, size) + payload
+
+
+for size, mtu in itertools.product(PAYLOAD_SIZES, MTUS):
+
+    @benchmark(f"sliced[{size}/{mtu - 3}]")
+    def bench_sliced(size=size, mtu=mtu):
+        data = bytes(size)
+        n = mtu - 3
+
+        def op():
+            for _ in sliced(data, n):
+                pass
+
+        return op
+
+    @benchmark(f"handle_rx[{size}/{mtu - 3}]")
+    def bench_handle_rx(size=size, mtu=mtu):
+        device = Kv4pHTDevice()
+        stream = audio_frame(size) * max(1, 65536 // size)
+        chunks = itertools.cycle(list(sliced(stream, mtu - 3)))
+
+        def op():
+            device.handle_rx(None, next(chunks))
+
+        return op
+
+
+@benchmark("handle_rx[512/244+metrics]")
+def bench_handle_rx_metrics():
+    device = Kv4pHTDevice(metrics=True)
+    stream = audio_frame(512) * 128
+    chunks = itertools.cycle(list(sliced(stream, 244)))
+
+    def op():
+        device.handle_rx(None, next(chunks))
+
+    return op
+
+
+@benchmark("encode_tune_to")
+def bench_encode_tune_to():
+    return lambda: encode_tune_to(146.52, 146.52, 12, 4, "N")
+
+
+@benchmark("encode_filters")
+def bench_encode_filters():
+    return lambda: encode_filters(True, False, True)
+
+
+@benchmark("encoder_batch[tune+filters]")
+def bench_encoder_batch():
+    encoder = CommandEncoder()
+
+    def op():
+        encoder.clear()
+        encoder.tune_to(146.52, 146.52, 12, 4, "N")
+        encoder.filters(True, False, True)
+        encoder.getvalue()
+
+    return op
+
+
+def resample_loop(samples, in_rate, out_rate):
+    # Per-sample reference for the audio benchmarks.
+    step = in_rate / out_rate
+    out = []
+    pos = 0.0
+    while pos < len(samples) - 1:
+        i = int(pos)
+        frac = pos - i
+        out.append(samples[i] + (samples[i + 1] - samples[i]) * frac)
+        pos += step
+    return out
+
+
+@benchmark("audio_rx[numpy]")
+def bench_audio_rx():
+    converter = RxConverter()
+    frame = audio_frame(AUDIO_FRAME_SIZE)[-AUDIO_FRAME_SIZE:]
+    return lambda: converter.process(frame)
+
+
+@benchmark("audio_rx[python]")
+def bench_audio_rx_loop():
+    frame = audio_frame(AUDIO_FRAME_SIZE)[-AUDIO_FRAME_SIZE:]
+
+    def op():
+        samples = [(x - 128) / 128 for x in frame]
+        resample_loop(samples, AUDIO_SAMPLE_RATE, CARD_SAMPLE_RATE)
+
+    return op
+
+
+@benchmark("audio_tx[numpy]")
+def bench_audio_tx():
+    converter = TxConverter()
+    frame = np.zeros(1024, dtype=np.int16)
+    return lambda: converter.process(frame)
+
+
+@benchmark("audio_tx[python]")
+def bench_audio_tx_loop():
+    frame = [0] * 1024
+
+    def op():
+        samples = [x / 32768 for x in frame]
+        resampled = resample_loop(samples, CARD_SAMPLE_RATE, AUDIO_SAMPLE_RATE)
+        bytes(min(255, max(0, int(x * 128 + 128.5))) for x in resampled)
+
+    return op
+
+
+def measure(op):
+    # Transient bytes allocated by one call, at its peak.
+    op()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Blocks still allocated after many calls, to catch unbounded growth.
+    blocks = sys.getallocatedblocks()
+    for _ in range(1000):
+        op()
+    retained = (sys.getallocatedblocks() - blocks) / 1000
+
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number)) / number
+
+    return {
+        "ops_per_sec": 1 / best,
+        "ns_per_op": best * 1e9,
+        "alloc_bytes_per_op": peak - current,
+        "retained_blocks_per_op": retained,
+    }
+
+
+def compare(results, baseline, threshold):
+    failures = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        result["vs_baseline"] = ratio
+        if ratio < 1 - threshold:
+            failures.append((name, ratio))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="filter", default="", help="only run matching")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--save-baseline", help="write results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = result = measure(factory())
+        print(
+            f"{name:32s} {result['ops_per_sec']:>14,.0f} ops/s "
+            f"{result['alloc_bytes_per_op']:>8d} B/op "
+            f"{result['retained_blocks_per_op']:>6.2f} blocks/op"
+        )
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.threshold)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    for name, ratio in failures:
+        print(f"REGRESSION {name}: {ratio:.0%} of baseline ops/sec")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Load check for DeviceManager against simulated peripherals.
+
+    python benchmarks/multi_radio.py
+    python benchmarks/multi_radio.py --radios 4 8 --seconds 10 --output load.json
+
+Each radio streams RX audio to a consumer, transmits TX audio and receives
+a retune from broadcast() every --command-interval seconds, all on one
+loop. Reports the process CPU used per radio count, and fails if any radio
+fell short of 90% of the expected audio in either direction or missed
+commands.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from kv4p import AUDIO_SAMPLE_RATE, CMD_TUNE_TO  # noqa: E402
+from manager import DeviceManager  # noqa: E402
+from simulator import SimulatedTransport  # noqa: E402
+
+
+async def consume(device, counts):
+    async for frame in device.receive_audio():
+        counts[device] += len(frame)
+
+
+async def retune(manager, interval, seconds):
+    sent = 0
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while loop.time() < end:
+        freq = 146.0 + 0.025 * (sent % 40)
+        await manager.broadcast("cmd_tune_to", freq, freq, 0, 4, "N")
+        sent += 1
+        await asyncio.sleep(interval)
+    return sent
+
+
+async def run(radios: int, seconds: float, command_interval: float) -> dict:
+    manager = DeviceManager(lambda address: SimulatedTransport(address=address))
+    for i in range(radios):
+        manager.create(f"sim-{i}")
+    failed = await manager.connect_all()
+    if failed:
+        raise RuntimeError(f"{len(failed)} simulated radios did not connect")
+
+    rx_bytes = {device: 0 for device in manager}
+    consumers = [asyncio.ensure_future(consume(d, rx_bytes)) for d in manager]
+    tx_audio = bytes(int(AUDIO_SAMPLE_RATE * seconds))
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    results = await asyncio.gather(
+        retune(manager, command_interval, seconds),
+        *(device.transmit(tx_audio) for device in manager),
+    )
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+
+    commands = results[0]
+    last_freq = 146.0 + 0.025 * ((commands - 1) % 40)
+    expected_audio = AUDIO_SAMPLE_RATE * seconds * 0.9
+    per_radio = []
+    for device in manager:
+        peripheral = device.transport.peripheral
+        tunes = sum(1 for cmd, _ in peripheral.commands if cmd == CMD_TUNE_TO)
+        per_radio.append(
+            {
+                "address": device.address,
+                "rx_bytes": rx_bytes[device],
+                "tx_bytes": peripheral.tx_audio_bytes,
+                "tunes": tunes,
+                "rx_overruns": device.rx_audio.overruns,
+                "ok": rx_bytes[device] >= expected_audio
+                and peripheral.tx_audio_bytes >= expected_audio
+                # Retunes coalesce while a write is pending, but every
+                # radio must end up on the last one.
+                and tunes > 0 and abs(peripheral.tuned[1] - last_freq) < 1e-4,
+            }
+        )
+
+    for consumer in consumers:
+        consumer.cancel()
+    await manager.disconnect_all()
+    return {
+        "radios": radios,
+        "cpu_percent": 100 * cpu / wall,
+        "wall_seconds": wall,
+        "commands": commands,
+        "ok": all(radio["ok"] for radio in per_radio),
+        "per_radio": per_radio,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--radios", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--command-interval", type=float, default=0.05)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for radios in args.radios:
+        result = asyncio.run(run(radios, args.seconds, args.command_interval))
+        results.append(result)
+        print(
+            f"{radios:3d} radios {result['cpu_percent']:6.1f}% CPU "
+            f"{result['commands']:5d} broadcasts "
+            f"{'ok' if result['ok'] else 'FAILED'}"
+        )
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+from kv4p import AUDIO_FRAME_SIZE, FRAME_AUDIO
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def waterfall_palette() -> bytes:
+    """
+    Black through blue and red to yellow, indexed by the scaled magnitude
+    of a spectrum band.
+    """
+    i = np.arange(256)
+    red = i * 3 - 256
+    green = i * 3 - 512
+    blue = np.where(i < 128, i * 2, 511 - i * 2)
+    rgb = np.stack([red, green, blue], axis=1)
+    return np.clip(rgb, 0, 255).astype(np.uint8).tobytes()
+
+
+WATERFALL_PALETTE = waterfall_palette()
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def encode_png(pixels: np.ndarray, palette: bytes) -> bytes:
+    """
+    Encodes *pixels*, a 2D uint8 array of palette indexes whose first
+    column is left zero for the per-row filter byte.
+    """
+    height, width = pixels.shape
+    header = struct.pack(">IIBBBBB", width - 1, height, 8, 3, 0, 0, 0)
+    return b"".join(
+        [
+            PNG_SIGNATURE,
+            png_chunk(b"IHDR", header),
+            png_chunk(b"PLTE", palette),
+            png_chunk(b"IDAT", zlib.compress(pixels.tobytes(), 1)),
+            png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+class SignalAnalyzer:
+    """
+    RMS level and spectrum of the RX audio, computed at most *rate* times a
+    second however fast frames arrive. The audio handler only copies the
+    newest frame; the analysis runs from ``run()`` on its own clock, so it
+    never delays audio delivery. The spectrum is reduced to *bins* bands
+    and kept as a waterfall of the last *history* rows.
+    """
+
+    def __init__(
+        self,
+        frame_size: int = AUDIO_FRAME_SIZE,
+        rate=15,
+        bins=64,
+        history=48,
+        floor_db=-80.0,
+    ):
+        self.frame_size = frame_size
+        self.rate = rate
+        self.bins = bins
+        self.floor_db = floor_db
+        self.latest = bytearray(frame_size)
+        self.latest_size = 0
+        self.fresh = False
+        self.window = np.hanning(frame_size).astype(np.float32)
+        self.samples = np.empty(frame_size, dtype=np.float32)
+        # Spectrum bins averaged into bands, dropping any remainder.
+        self.band_width = (frame_size // 2) // bins
+        # One row per tick, the first column holds PNG filter bytes.
+        self.waterfall = np.zeros((history, bins + 1), dtype=np.uint8)
+        self.row = 0
+        self.level = 0.0
+        self.frames = 0
+        self.analyzed = 0
+        self.updates = 0
+
+    def attach(self, device):
+        device.parser.add_handler(FRAME_AUDIO, self.handle_audio)
+
+    def detach(self, device):
+        device.parser.remove_handler(FRAME_AUDIO, self.handle_audio)
+
+    def handle_audio(self, payload: memoryview):
+        n = min(len(payload), self.frame_size)
+        self.latest[:n] = payload[:n]
+        self.latest_size = n
+        self.fresh = True
+        self.frames += 1
+
+    def analyze(self):
+        """
+        Updates the level and adds a waterfall row from the newest frame.
+        """
+        n = self.latest_size
+        pcm = np.frombuffer(self.latest, dtype=np.uint8, count=n)
+        samples = self.samples
+        samples[n:] = 0
+        np.subtract(pcm, 128, out=samples[:n], dtype=np.float32)
+        samples *= 1 / 128
+        self.level = float(np.sqrt(np.mean(np.square(samples[:n]))))
+
+        samples *= self.window
+        magnitude = np.abs(np.fft.rfft(samples))[1 : self.bins * self.band_width + 1]
+        bands = magnitude.reshape(self.bins, self.band_width).mean(axis=1)
+        db = 20 * np.log10(bands / (self.frame_size / 4) + 1e-9)
+        scaled = np.clip((db - self.floor_db) * (255 / -self.floor_db), 0, 255)
+        self.row = (self.row - 1) % len(self.waterfall)
+        self.waterfall[self.row, 1:] = scaled
+        self.analyzed += 1
+
+    def waterfall_png(self) -> bytes:
+        """
+        The waterfall with the newest row at the top.
+        """
+        pixels = np.roll(self.waterfall, -self.row, axis=0)
+        return encode_png(pixels, WATERFALL_PALETTE)
+
+    def waterfall_base64(self) -> str:
+        return base64.b64encode(self.waterfall_png()).decode("ascii")
+
+    async def run(self, on_update):
+        """
+        Calls *on_update(analyzer)* after each analysis, at most *rate*
+        times a second and only when new audio arrived since the last one.
+        """
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        start = loop.time()
+        ticks = 0
+        while True:
+            ticks += 1
+            delay = start + ticks * interval - loop.time()
+            if delay < 0:
+                # Fell behind, skip the missed ticks instead of bursting.
+                start, ticks = loop.time(), 0
+            await asyncio.sleep(max(0, delay))
+            if not self.fresh:
+                continue
+            self.fresh = False
+            self.analyze()
+            self.updates += 1
+            on_update(self)
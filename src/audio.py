@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+
+from kv4p import AUDIO_FRAME_SIZE, AUDIO_SAMPLE_RATE
+
+# Common sound card rate, the radio runs at AUDIO_SAMPLE_RATE.
+CARD_SAMPLE_RATE = 48000
+
+
+class Resampler:
+    """
+    Streaming linear interpolation resampler for float32 frames of up to
+    *max_frame* samples. The last input sample and the fractional output
+    position carry over between frames, so consecutive frames join without
+    clicks. Output is written to a preallocated array and returned as a view
+    that is only valid until the next call.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, max_frame: int):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.step = in_rate / out_rate
+        self.max_frame = max_frame
+        max_out = math.ceil((max_frame + 1) / self.step) + 1
+        self.offsets = np.arange(max_out, dtype=np.float64) * self.step
+        # Input with the previous frame's last sample in front of it.
+        self.x = np.zeros(max_frame + 1, dtype=np.float32)
+        self.pos = np.empty(max_out, dtype=np.float64)
+        self.idx = np.empty(max_out, dtype=np.intp)
+        self.frac = np.empty(max_out, dtype=np.float32)
+        self.lo = np.empty(max_out, dtype=np.float32)
+        self.hi = np.empty(max_out, dtype=np.float32)
+        self.out = np.empty(max_out, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.x[0] = 0.0
+        self.phase = 1.0
+
+    def output_size(self, n: int) -> int:
+        return max(0, math.floor((n - self.phase) / self.step) + 1)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        n = len(frame)
+        if n > self.max_frame:
+            raise ValueError(f"frame of {n} samples, max {self.max_frame}")
+        if self.in_rate == self.out_rate:
+            self.out[:n] = frame
+            return self.out[:n]
+
+        x = self.x
+        x[1 : n + 1] = frame
+        k = self.output_size(n)
+        pos, idx, frac = self.pos[:k], self.idx[:k], self.frac[:k]
+        lo, hi, out = self.lo[:k], self.hi[:k], self.out[:k]
+
+        # Positions are always positive, so truncating is flooring.
+        np.add(self.offsets[:k], self.phase, out=pos)
+        idx[:] = pos
+        np.subtract(pos, idx, out=frac, casting="unsafe")
+        # Positions never pass index n, clamp the neighbour for the last one.
+        np.take(x, idx, out=lo)
+        idx += 1
+        np.minimum(idx, n, out=idx)
+        np.take(x, idx, out=hi)
+        np.subtract(hi, lo, out=hi)
+        np.multiply(hi, frac, out=hi)
+        np.add(lo, hi, out=out)
+
+        self.phase += k * self.step - n
+        x[0] = x[n]
+        return out
+
+
+class RxConverter:
+    """
+    Radio to sound card: 8-bit unsigned PCM frames at *in_rate* become
+    float32 in [-1, 1) or int16 samples at *out_rate*.
+    """
+
+    def __init__(
+        self,
+        frame_size: int = AUDIO_FRAME_SIZE,
+        in_rate: int = AUDIO_SAMPLE_RATE,
+        out_rate: int = CARD_SAMPLE_RATE,
+        dtype=np.float32,
+    ):
+        self.dtype = np.dtype(dtype)
+        self.samples = np.empty(frame_size, dtype=np.float32)
+        self.resampler = Resampler(in_rate, out_rate, frame_size)
+        self.int16 = np.empty(len(self.resampler.out), dtype=np.int16)
+
+    def reset(self):
+        self.resampler.reset()
+
+    def process(self, frame) -> np.ndarray:
+        """
+        Converts one frame. The returned array is reused by the next call.
+        """
+        pcm = np.frombuffer(frame, dtype=np.uint8)
+        samples = self.samples[: len(pcm)]
+        np.subtract(pcm, 128, out=samples, dtype=np.float32)
+        samples *= 1 / 128
+        out = self.resampler.process(samples)
+        if self.dtype == np.float32:
+            return out
+        int16 = self.int16[: len(out)]
+        np.multiply(out, 32768, out=out)
+        np.clip(out, -32768, 32767, out=out)
+        int16[:] = out
+        return int16
+
+
+class TxConverter:
+    """
+    Sound card to radio: float32 in [-1, 1) or int16 samples at *in_rate*
+    become 8-bit unsigned PCM at *out_rate*, ready for ``send_audio``.
+    """
+
+    def __init__(
+        self,
+        frame_size: int = 1024,
+        in_rate: int = CARD_SAMPLE_RATE,
+        out_rate: int = AUDIO_SAMPLE_RATE,
+    ):
+        self.samples = np.empty(frame_size, dtype=np.float32)
+        self.resampler = Resampler(in_rate, out_rate, frame_size)
+        self.pcm = np.empty(len(self.resampler.out), dtype=np.uint8)
+
+    def reset(self):
+        self.resampler.reset()
+
+    def process(self, frame: np.ndarray) -> memoryview:
+        """
+        Converts one frame. The returned buffer is reused by the next call.
+        """
+        samples = self.samples[: len(frame)]
+        if frame.dtype == np.int16:
+            np.multiply(frame, 1 / 32768, out=samples, dtype=np.float32)
+        else:
+            samples[:] = frame
+        out = self.resampler.process(samples)
+        np.multiply(out, 128, out=out)
+        np.add(out, 128.5, out=out)
+        np.clip(out, 0, 255, out=out)
+        pcm = self.pcm[: len(out)]
+        np.floor(out, out=out)
+        pcm[:] = out
+        return memoryview(pcm)
@@ -0,0 +1,286 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import struct
+import time
+from collections import deque
+
+from kv4p import FRAME_AUDIO
+
+# Every packet is a little-endian sequence number followed by one RX frame
+# of 8-bit unsigned PCM, sent as is over UDP and as a binary WebSocket
+# message. Gaps in the sequence are dropped frames.
+PACKET_HEADER = struct.Struct("<I")
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def websocket_header(size: int) -> bytes:
+    # FIN and binary opcode, server frames are never masked.
+    if size < 126:
+        return struct.pack("!BB", 0x82, size)
+    if size < 1 << 16:
+        return struct.pack("!BBH", 0x82, 126, size)
+    return struct.pack("!BBQ", 0x82, 127, size)
+
+
+class AudioListener:
+    """
+    A listener's position in the shared stream. *lag* is how many frames it
+    is behind the newest one.
+    """
+
+    def __init__(self, server, peer):
+        self.server = server
+        self.peer = peer
+        self.next_seq = server.seq
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0
+
+    @property
+    def lag(self) -> int:
+        return self.server.seq - self.next_seq
+
+    def next_packet(self):
+        """
+        The next packet for this listener, skipping ahead over frames that
+        already left the ring. None when it is caught up.
+        """
+        server = self.server
+        lag = server.seq - self.next_seq
+        if lag <= 0:
+            return None
+        if lag > len(server.ring):
+            self.dropped += lag - len(server.ring)
+            lag = len(server.ring)
+        if lag > self.max_lag:
+            self.max_lag = lag
+        self.next_seq = server.seq - lag + 1
+        self.sent += 1
+        return server.ring[-lag]
+
+    def stats(self) -> dict:
+        return {
+            "peer": str(self.peer),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+
+class AudioServer:
+    """
+    Publishes RX audio to local listeners over UDP and WebSocket. Each frame
+    is framed once, for WebSocket, into a ring of the last *ring_size*
+    packets that every listener reads from at its own pace, UDP listeners
+    getting a view of the same buffer without the WebSocket header. Taking
+    a frame costs the same however many listeners there are; a listener
+    that falls more than the ring behind skips ahead and counts the frames
+    it missed.
+
+    UDP listeners subscribe by sending any datagram to the UDP port and
+    must repeat it within *udp_timeout* seconds to stay subscribed; "bye"
+    unsubscribes.
+    """
+
+    def __init__(
+        self,
+        device,
+        host="127.0.0.1",
+        udp_port=8766,
+        websocket_port=8767,
+        ring_size=64,
+        udp_timeout=10.0,
+    ):
+        self.device = device
+        self.host = host
+        self.udp_port = udp_port
+        self.websocket_port = websocket_port
+        self.udp_timeout = udp_timeout
+        self.ring = deque(maxlen=ring_size)
+        self.seq = 0
+        self.wakeup = asyncio.Event()
+        self.udp = None
+        self.udp_listeners = {}
+        self.websocket_listeners = {}
+        self.websocket_server = None
+        self.tasks = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.udp_port:
+            self.udp, _ = await loop.create_datagram_endpoint(
+                lambda: AudioDatagramProtocol(self),
+                local_addr=(self.host, self.udp_port),
+            )
+            self.tasks.append(asyncio.ensure_future(self.send_udp()))
+        if self.websocket_port:
+            self.websocket_server = await asyncio.start_server(
+                self.handle_websocket, self.host, self.websocket_port
+            )
+        self.device.parser.add_handler(FRAME_AUDIO, self.handle_audio)
+        logging.info(
+            "serving audio on udp %s, websocket %s", self.udp_port, self.websocket_port
+        )
+
+    async def stop(self):
+        self.device.parser.remove_handler(FRAME_AUDIO, self.handle_audio)
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        for writer in self.websocket_listeners.values():
+            writer.close()
+        # Wake the listeners so they see their connection closing.
+        self.wakeup.set()
+        if self.udp is not None:
+            self.udp.close()
+            self.udp = None
+        if self.websocket_server is not None:
+            self.websocket_server.close()
+            await self.websocket_server.wait_closed()
+            self.websocket_server = None
+
+    def handle_audio(self, payload: memoryview):
+        size = PACKET_HEADER.size + len(payload)
+        header = websocket_header(size)
+        self.ring.append(
+            (
+                b"".join((header, PACKET_HEADER.pack(self.seq & 0xFFFFFFFF), payload)),
+                len(header),
+            )
+        )
+        self.seq += 1
+        wakeup, self.wakeup = self.wakeup, asyncio.Event()
+        wakeup.set()
+
+    def subscribe_udp(self, data: bytes, addr):
+        if data.strip() == b"bye":
+            if self.udp_listeners.pop(addr, None) is not None:
+                logging.info("udp listener %s left", addr)
+            return
+        listener = self.udp_listeners.get(addr)
+        if listener is None:
+            listener = self.udp_listeners[addr] = AudioListener(self, addr)
+            logging.info("udp listener %s joined", addr)
+        listener.last_seen = time.monotonic()
+
+    async def send_udp(self):
+        """
+        Sends every new packet to all UDP listeners. The datagram transport
+        never blocks, so a listener only misses frames when the whole
+        socket falls behind, which is counted for everyone.
+        """
+        cursor = AudioListener(self, "udp")
+        while True:
+            wakeup = self.wakeup
+            dropped = cursor.dropped
+            item = cursor.next_packet()
+            if item is None:
+                await wakeup.wait()
+                self.expire_udp()
+                continue
+            packet, offset = item
+            view = memoryview(packet)[offset:]
+            for addr, listener in self.udp_listeners.items():
+                listener.next_seq = cursor.next_seq
+                listener.dropped += cursor.dropped - dropped
+                if self.udp.get_write_buffer_size():
+                    listener.dropped += 1
+                    continue
+                self.udp.sendto(view, addr)
+                listener.sent += 1
+
+    def expire_udp(self):
+        deadline = time.monotonic() - self.udp_timeout
+        for addr, listener in list(self.udp_listeners.items()):
+            if listener.last_seen < deadline:
+                del self.udp_listeners[addr]
+                logging.info("udp listener %s timed out", addr)
+
+    async def handle_websocket(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            if not await self.websocket_handshake(reader, writer):
+                return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            return
+
+        listener = AudioListener(self, peer)
+        self.websocket_listeners[listener] = writer
+        logging.info("websocket listener %s joined", peer)
+        watcher = asyncio.ensure_future(self.watch_websocket(reader, writer))
+        try:
+            while not writer.is_closing():
+                wakeup = self.wakeup
+                item = listener.next_packet()
+                if item is None:
+                    await wakeup.wait()
+                    continue
+                writer.write(item[0])
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            watcher.cancel()
+            self.websocket_listeners.pop(listener, None)
+            writer.close()
+            logging.info(
+                "websocket listener %s left, sent %d dropped %d",
+                peer,
+                listener.sent,
+                listener.dropped,
+            )
+
+    async def watch_websocket(self, reader, writer):
+        # Anything the client sends, including a close frame, is ignored
+        # until the connection goes away.
+        try:
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def websocket_handshake(self, reader, writer) -> bool:
+        request = await reader.readuntil(b"\r\n\r\n")
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return False
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        await writer.drain()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.seq,
+            "udp": [listener.stats() for listener in self.udp_listeners.values()],
+            "websocket": [listener.stats() for listener in self.websocket_listeners],
+        }
+
+
+class AudioDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: AudioServer):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self.server.subscribe_udp(data, addr)
+
+    def error_received(self, exc):
+        logging.debug("udp error: %s", exc)
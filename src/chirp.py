@@ -0,0 +1,178 @@
+import csv
+import logging
+import time
+
+from kv4p import check_frequency_range, ctcss_tone_list
+
+CHIRP_COLUMNS = [
+    "Location",
+    "Name",
+    "Frequency",
+    "Duplex",
+    "Offset",
+    "Tone",
+    "rToneFreq",
+    "cToneFreq",
+    "DtcsCode",
+    "DtcsPolarity",
+    "Mode",
+    "TStep",
+    "Skip",
+    "Comment",
+]
+
+# CHIRP writes tones as "88.5", tone indexes start at 1 because 0 is "None".
+TONE_INDEX = {f"{v:.1f}": i for i, v in enumerate(ctcss_tone_list, start=1)}
+TONE_FREQ = {i: v for v, i in TONE_INDEX.items()}
+
+BANDWIDTHS = {"FM": "W", "NFM": "N"}
+MODES = {"W": "FM", "N": "NFM"}
+
+
+class ImportReport:
+    """
+    Outcome of an import. Only the first *keep* rejected rows are kept with
+    their reasons, the rest are just counted.
+    """
+
+    def __init__(self, keep=100):
+        self.keep = keep
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.rejects) < self.keep:
+            self.rejects.append((line, reason))
+
+
+def tone_index(value: str) -> int:
+    try:
+        return TONE_INDEX[f"{float(value):.1f}"]
+    except (KeyError, ValueError):
+        raise ValueError(f"unsupported CTCSS tone {value!r}")
+
+
+def parse_row(row: dict) -> dict:
+    rx_freq = round(float(row["Frequency"]), 4)
+    if not check_frequency_range(rx_freq):
+        raise ValueError(f"frequency {rx_freq} out of range")
+
+    duplex = row.get("Duplex", "")
+    offset = float(row.get("Offset") or 0)
+    if duplex == "+":
+        tx_freq = round(rx_freq + offset, 4)
+    elif duplex == "-":
+        tx_freq = round(rx_freq - offset, 4)
+    elif duplex == "split":
+        tx_freq = round(offset, 4)
+    elif duplex in ("", "off"):
+        tx_freq = rx_freq
+    else:
+        raise ValueError(f"unsupported duplex {duplex!r}")
+    if not check_frequency_range(tx_freq):
+        raise ValueError(f"tx frequency {tx_freq} out of range")
+
+    tone = row.get("Tone", "")
+    if tone == "":
+        ctcss = 0
+    elif tone == "Tone":
+        ctcss = tone_index(row["rToneFreq"])
+    elif tone == "TSQL":
+        ctcss = tone_index(row["cToneFreq"])
+    else:
+        raise ValueError(f"unsupported tone mode {tone!r}")
+
+    mode = row.get("Mode") or "NFM"
+    if mode not in BANDWIDTHS:
+        raise ValueError(f"unsupported mode {mode!r}")
+
+    return {
+        "rx_freq": rx_freq,
+        "tx_freq": tx_freq,
+        "rx_tx_split": tx_freq != rx_freq,
+        "ctcss_tone": str(ctcss),
+        "bandwidth": BANDWIDTHS[mode],
+        "gain": 4,
+    }
+
+
+def read_chirp(f, report: ImportReport):
+    """
+    Yields (name, preset) pairs from a CHIRP CSV file one row at a time,
+    recording rows that cannot be used in *report*.
+    """
+    reader = csv.DictReader(f)
+    names = set()
+    for row in reader:
+        try:
+            preset = parse_row(row)
+        except (KeyError, TypeError, ValueError) as e:
+            report.reject(reader.line_num, str(e))
+            continue
+
+        name = (row.get("Name") or "").strip() or row.get("Location") or ""
+        if not name or name in names:
+            name = f"{name} ({row.get('Location') or reader.line_num})".strip()
+        names.add(name)
+        report.imported += 1
+        yield name, preset
+
+
+async def import_chirp(path: str, presets, batch_size=500) -> ImportReport:
+    report = ImportReport()
+    started = time.perf_counter()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        await presets.put_many(read_chirp(f, report), batch_size)
+    report.elapsed = time.perf_counter() - started
+    logging.info(
+        "imported %d presets from %s in %.1fs, rejected %d",
+        report.imported,
+        path,
+        report.elapsed,
+        report.rejected,
+    )
+    return report
+
+
+def write_chirp(f, items):
+    writer = csv.writer(f)
+    writer.writerow(CHIRP_COLUMNS)
+    for location, (name, preset) in enumerate(items):
+        rx_freq = float(preset["rx_freq"])
+        tx_freq = float(preset["tx_freq"]) if preset.get("rx_tx_split") else rx_freq
+        if tx_freq == rx_freq:
+            duplex, offset = "", 0.0
+        elif abs(tx_freq - rx_freq) < 10:
+            duplex = "+" if tx_freq > rx_freq else "-"
+            offset = abs(tx_freq - rx_freq)
+        else:
+            duplex, offset = "split", tx_freq
+
+        tone = TONE_FREQ.get(int(preset.get("ctcss_tone") or 0))
+        writer.writerow(
+            [
+                location,
+                name,
+                f"{rx_freq:.6f}",
+                duplex,
+                f"{offset:.6f}",
+                "Tone" if tone else "",
+                tone or "88.5",
+                tone or "88.5",
+                "023",
+                "NN",
+                MODES.get(preset.get("bandwidth"), "NFM"),
+                "5.00",
+                "",
+                "",
+            ]
+        )
+
+
+def export_chirp(path: str, presets):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        write_chirp(f, ((name, presets.get(name)) for name in presets.names()))
+    logging.info("exported %d presets to %s", len(presets), path)
@@ -0,0 +1,160 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from kv4p import AUDIO_FRAME_SIZE, AUDIO_SAMPLE_RATE
+
+# FADE_TABLES[n] scales 8-bit unsigned samples towards silence (128) by
+# 0.5 ** (n + 1), used to fade out repeated frames when concealing loss.
+FADE_TABLES = [
+    bytes(128 + int((x - 128) * 0.5 ** (n + 1)) for x in range(256)) for n in range(4)
+]
+SILENCE = 128
+
+
+class JitterBuffer:
+    """
+    Adaptive playout buffer for RX audio frames. Frames are put as they
+    arrive and taken at a steady rate by the sink. The target depth follows
+    the smoothed arrival jitter, and a frame is skipped whenever the buffer
+    runs above target so latency comes back down. Missing frames are
+    concealed by repeating the last frame with a fade, then silence.
+    """
+
+    def __init__(
+        self,
+        frame_size: int = AUDIO_FRAME_SIZE,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        min_depth=1,
+        max_depth=16,
+    ):
+        self.frame_size = frame_size
+        self.frame_duration = frame_size / sample_rate
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        # Buffers cycle between the free list and the queue, nothing is
+        # allocated per frame.
+        self.free = [bytearray(frame_size) for _ in range(max_depth + 1)]
+        self.frames = deque()
+        self.out = bytearray(frame_size)
+        self.silent = bytes([SILENCE]) * frame_size
+        self.reset()
+
+    def reset(self):
+        while self.frames:
+            self.free.append(self.frames.popleft())
+        self.out[:] = self.silent
+        self.last_arrival = None
+        self.jitter = 0.0
+        self.target_depth = self.min_depth
+        self.playing = False
+        self.concealing = 0
+        self.received = 0
+        self.played = 0
+        self.underruns = 0
+        self.concealed = 0
+        self.overflows = 0
+        self.dropped_for_latency = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.frames)
+
+    @property
+    def added_latency(self) -> float:
+        return len(self.frames) * self.frame_duration
+
+    def put(self, frame, arrival: float = None):
+        if arrival is None:
+            arrival = time.monotonic()
+        if self.last_arrival is not None:
+            # Interarrival jitter as in RFC 3550, in seconds.
+            d = abs(arrival - self.last_arrival - self.frame_duration)
+            self.jitter += (d - self.jitter) / 16
+        self.last_arrival = arrival
+        self.received += 1
+
+        target = self.min_depth + math.ceil(2 * self.jitter / self.frame_duration)
+        self.target_depth = min(self.max_depth, target)
+
+        if self.free:
+            buf = self.free.pop()
+        else:
+            buf = self.frames.popleft()
+            self.overflows += 1
+        buf[:] = frame
+        self.frames.append(buf)
+
+    def get(self) -> bytearray:
+        """
+        Returns the next frame to play. The buffer is reused by the next call.
+        """
+        if not self.playing:
+            if len(self.frames) < self.target_depth:
+                return self.silence()
+            self.playing = True
+
+        if not self.frames:
+            return self.conceal()
+
+        if len(self.frames) > self.target_depth + 1:
+            # Running above target adds latency, skip a frame to catch up.
+            self.free.append(self.frames.popleft())
+            self.dropped_for_latency += 1
+
+        buf = self.frames.popleft()
+        self.out[:] = buf
+        self.free.append(buf)
+        self.concealing = 0
+        self.played += 1
+        return self.out
+
+    def conceal(self) -> bytearray:
+        self.underruns += 1
+        self.concealed += 1
+        if self.concealing < len(FADE_TABLES):
+            self.out[:] = self.out.translate(FADE_TABLES[self.concealing])
+            self.concealing += 1
+            return self.out
+        # Out of audio for a while, rebuffer up to the target before playing.
+        self.playing = False
+        return self.silence()
+
+    def silence(self) -> bytearray:
+        self.out[:] = self.silent
+        return self.out
+
+    async def feed(self, frames):
+        """
+        Puts every frame from the async iterator *frames*, e.g.
+        ``device.receive_audio(frame_size)``.
+        """
+        async for frame in frames:
+            self.put(frame)
+
+    async def playout(self, sink):
+        """
+        Calls *sink(frame)* once per frame duration on a drift-free clock.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        ticks = 0
+        while True:
+            sink(self.get())
+            ticks += 1
+            await asyncio.sleep(
+                max(0, start + ticks * self.frame_duration - loop.time())
+            )
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "target_depth": self.target_depth,
+            "jitter": self.jitter,
+            "added_latency": self.added_latency,
+            "underruns": self.underruns,
+            "concealed": self.concealed,
+            "overflows": self.overflows,
+            "dropped_for_latency": self.dropped_for_latency,
+        }
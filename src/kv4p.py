@@ -1,19 +1,63 @@
+from __future__ import annotations
+
 import asyncio
+import bisect
+import json
 import logging
-from bleak import BleakClient
-from bleak.backends.characteristic import BleakGATTCharacteristic
-import asyncio
+import struct
 import sys
+import time
+from collections import deque
 from itertools import count, takewhile
-from typing import Iterator
+from typing import TYPE_CHECKING, Iterator
 
-from bleak import BleakClient, BleakScanner
-from bleak.backends.characteristic import BleakGATTCharacteristic
-from bleak.backends.device import BLEDevice
-from bleak.backends.scanner import AdvertisementData
+# Bleak is only imported by BleakTransport on first connect, it is slow to
+# import and not needed until then.
+if TYPE_CHECKING:
+    from bleak import BleakClient
+    from bleak.backends.characteristic import BleakGATTCharacteristic
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
 
 COMMAND_HEADER = bytearray([0xDE, 0xAD, 0xBE, 0xEF, 0xDE, 0xAD, 0xBE, 0xEF])
 
+CMD_PTT_DOWN = 0x01
+CMD_PTT_UP = 0x02
+CMD_TUNE_TO = 0x03
+CMD_FILTERS = 0x04
+CMD_STOP = 0x05
+CMD_GET_FIRMWARE_VER = 0x06
+
+COMMAND_NAMES = {
+    CMD_PTT_DOWN: "ptt_down",
+    CMD_PTT_UP: "ptt_up",
+    CMD_TUNE_TO: "tune_to",
+    CMD_FILTERS: "filters",
+    CMD_STOP: "stop",
+    CMD_GET_FIRMWARE_VER: "get_firmware_ver",
+}
+
+# Outbound packet layouts, all fields after the command byte are ASCII.
+TUNE_TO_PACKET = struct.Struct("8sB8s8s2s1s1s")
+FILTERS_PACKET = struct.Struct("8sB3B")
+FIRMWARE_VER_PACKET = struct.Struct("8sB1s")
+
+PTT_DOWN_PACKET = bytes(COMMAND_HEADER) + bytes([CMD_PTT_DOWN])
+PTT_UP_PACKET = bytes(COMMAND_HEADER) + bytes([CMD_PTT_UP])
+STOP_PACKET = bytes(COMMAND_HEADER) + bytes([CMD_STOP])
+
+# Inbound frames are COMMAND_HEADER, a frame type byte, a little-endian
+# payload length and the payload.
+FRAME_AUDIO = 0x01
+FRAME_FIRMWARE_VERSION = 0x02
+FRAME_STATUS = 0x03
+FRAME_HEADER = struct.Struct("<BH")
+MAX_FRAME_PAYLOAD = 4096
+
+# RX audio is 8-bit unsigned mono PCM.
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_FRAME_SIZE = 512
+
 
 UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_RX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
@@ -38,34 +82,1071 @@ def match_nus_uuid(device: BLEDevice, adv: AdvertisementData):
     return False
 
 
-class Kv4pHTDevice:
+class CommandEncoder:
+    """
+    Packs outbound commands back to back into one reusable buffer, so several
+    commands can go out in as few MTU-sized writes as possible.
+    """
+
+    def __init__(self, size: int = 128):
+        self.buf = bytearray(size)
+        self.length = 0
+
+    def clear(self):
+        self.length = 0
+
+    def reserve(self, n: int) -> int:
+        offset = self.length
+        if offset + n > len(self.buf):
+            self.buf.extend(bytes(offset + n - len(self.buf)))
+        self.length += n
+        return offset
+
+    def append(self, packet: bytes):
+        offset = self.reserve(len(packet))
+        self.buf[offset : self.length] = packet
+
+    def ptt_down(self):
+        self.append(PTT_DOWN_PACKET)
+
+    def ptt_up(self):
+        self.append(PTT_UP_PACKET)
+
+    def stop(self):
+        self.append(STOP_PACKET)
+
+    def tune_to(self, tx_freq, rx_freq, tone, squelch, bandwidth):
+        TUNE_TO_PACKET.pack_into(
+            self.buf,
+            self.reserve(TUNE_TO_PACKET.size),
+            COMMAND_HEADER,
+            CMD_TUNE_TO,
+            b"%8.4f" % tx_freq,
+            b"%8.4f" % rx_freq,
+            b"%02d" % tone,
+            b"%d" % squelch,
+            bandwidth.encode("ASCII"),
+        )
+
+    def filters(self, emphasis, high, low):
+        FILTERS_PACKET.pack_into(
+            self.buf,
+            self.reserve(FILTERS_PACKET.size),
+            COMMAND_HEADER,
+            CMD_FILTERS,
+            0x30 + bool(emphasis),
+            0x30 + bool(high),
+            0x30 + bool(low),
+        )
+
+    def get_firmware_ver(self, band: str):
+        FIRMWARE_VER_PACKET.pack_into(
+            self.buf,
+            self.reserve(FIRMWARE_VER_PACKET.size),
+            COMMAND_HEADER,
+            CMD_GET_FIRMWARE_VER,
+            band.encode("ASCII"),
+        )
+
+    def getvalue(self) -> bytes:
+        return bytes(memoryview(self.buf)[: self.length])
+
+
+def encode_tune_to(tx_freq, rx_freq, tone, squelch, bandwidth) -> bytes:
+    return TUNE_TO_PACKET.pack(
+        COMMAND_HEADER,
+        CMD_TUNE_TO,
+        b"%8.4f" % tx_freq,
+        b"%8.4f" % rx_freq,
+        b"%02d" % tone,
+        b"%d" % squelch,
+        bandwidth.encode("ASCII"),
+    )
+
+
+def encode_filters(emphasis, high, low) -> bytes:
+    return FILTERS_PACKET.pack(
+        COMMAND_HEADER,
+        CMD_FILTERS,
+        0x30 + bool(emphasis),
+        0x30 + bool(high),
+        0x30 + bool(low),
+    )
+
+
+def encode_get_firmware_ver(band: str) -> bytes:
+    return FIRMWARE_VER_PACKET.pack(
+        COMMAND_HEADER, CMD_GET_FIRMWARE_VER, band.encode("ASCII")
+    )
+
+
+class CommandQueue:
+    """
+    Outbound commands waiting for the writer task. Commands queued with a
+    *key* carry radio state: queuing another one with the same key replaces
+    the pending payload in place, so only the newest value is sent and the
+    replaced one is counted in *coalesced*. Commands without a key are never
+    merged and keep their order. Each entry carries the time it was queued,
+    None when nobody is timing it, and an optional *sent* future that the
+    writer resolves to True once the command is written, or to False if it
+    is replaced, discarded or its write fails.
+    """
+
     def __init__(self):
-        self.rx_char = None
+        self.items = deque()
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, data: bytes, key=None, queued_at=None, sent=None):
+        if key is not None:
+            entry = self.pending.get(key)
+            if entry is not None:
+                # The replacement keeps the place and time of the first.
+                entry[1] = data
+                if entry[2] is None:
+                    entry[2] = queued_at
+                resolve_sent([entry], False)
+                entry[3] = sent
+                self.coalesced += 1
+                return
+            entry = self.pending[key] = [key, data, queued_at, sent]
+        else:
+            entry = [None, data, queued_at, sent]
+        self.items.append(entry)
+        self.ready.set()
+
+    def pop(self):
+        """
+        Removes and returns the oldest [key, data, queued_at, sent] entry.
+        """
+        entry = self.items.popleft()
+        if entry[0] is not None:
+            del self.pending[entry[0]]
+        return entry
+
+    def get_nowait(self) -> bytes:
+        return self.pop()[1]
+
+    async def wait(self):
+        while not self.items:
+            self.ready.clear()
+            await self.ready.wait()
+
+    async def get(self) -> bytes:
+        await self.wait()
+        return self.get_nowait()
+
+    def discard_unkeyed(self):
+        resolve_sent([entry for entry in self.items if entry[0] is None], False)
+        self.items = deque(entry for entry in self.items if entry[0] is not None)
+
+
+def resolve_sent(entries, written: bool):
+    for entry in entries:
+        sent = entry[3]
+        # The waiter may have been cancelled.
+        if sent is not None and not sent.done():
+            sent.set_result(written)
+
+
+class WriteLock:
+    """
+    Lock around link writes where priority acquirers (PTT, stop) are handed
+    the lock before anyone already waiting without priority. The holder is
+    never interrupted.
+    """
+
+    def __init__(self):
+        self.held = False
+        self.waiters = deque()
+        self.priority_waiters = deque()
+
+    def locked(self) -> bool:
+        return self.held
+
+    async def acquire(self, priority=False):
+        if not self.held:
+            self.held = True
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        waiters = self.priority_waiters if priority else self.waiters
+        waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed the lock just as we were cancelled, pass it on.
+                self.release()
+            elif waiter in waiters:
+                # release() may already have dropped it as cancelled.
+                waiters.remove(waiter)
+            raise
+
+    def release(self):
+        for waiters in (self.priority_waiters, self.waiters):
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    # Ownership passes straight to the waiter.
+                    waiter.set_result(None)
+                    return
+        self.held = False
+
+
+class FrameParser:
+    """
+    Resumable parser for inbound notifications. Data is accumulated in one
+    buffer that only ever holds the unparsed tail, headers are located with
+    ``bytearray.find`` and payloads are handed to handlers as memoryviews
+    into that buffer. Handlers must copy a payload if they keep it.
+    """
+
+    def __init__(self, max_payload: int = MAX_FRAME_PAYLOAD):
+        self.max_payload = max_payload
+        self.buf = bytearray()
+        self.handlers = {}
+        self.reset()
+
+    def reset(self):
+        self.buf.clear()
+        self.frames = 0
+        self.unhandled = 0
+        self.garbage_bytes = 0
+        self.resyncs = 0
+        # Garbage was dropped since the last frame, possibly in an earlier
+        # feed(), so the next frame found is a resync.
+        self.discarding = False
+        # An incomplete frame at the start of the buffer: how many bytes of
+        # it were already searched for headers, and where it ends.
+        self.searched = 0
+        self.pending_end = 0
+
+    def add_handler(self, frame_type: int, handler):
+        self.handlers.setdefault(frame_type, []).append(handler)
+
+    def remove_handler(self, frame_type: int, handler):
+        handlers = self.handlers.get(frame_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        with memoryview(buf) as view:
+            consumed = self.parse(view)
+        del buf[:consumed]
+
+    def parse(self, view) -> int:
+        buf = self.buf
+        end = len(buf)
+        header_len = len(COMMAND_HEADER)
+        prefix_len = header_len + FRAME_HEADER.size
+        if self.searched:
+            # Waiting for the rest of a frame, only new bytes need a look.
+            if end < self.pending_end and (
+                buf.find(COMMAND_HEADER, self.searched - header_len + 1) < 0
+            ):
+                self.searched = end
+                return 0
+            self.searched = 0
+        pos = 0
+        start = buf.find(COMMAND_HEADER)
+        while True:
+            if start < 0:
+                # Keep enough of the tail to complete a split header.
+                keep = max(pos, end - header_len + 1)
+                if keep > pos:
+                    self.garbage_bytes += keep - pos
+                    self.discarding = True
+                return keep
+
+            if start > pos:
+                self.garbage_bytes += start - pos
+                self.discarding = True
+
+            if end - start < prefix_len:
+                return start
+
+            frame_type, length = FRAME_HEADER.unpack_from(buf, start + header_len)
+            if length > self.max_payload:
+                # Not a real frame, resync on the next header.
+                self.garbage_bytes += 1
+                self.discarding = True
+                pos = start + 1
+                start = buf.find(COMMAND_HEADER, pos)
+                continue
+
+            # The next header doubles as a check on this frame: payloads
+            # never contain one, so a header inside means the length was
+            # bogus. Resync there instead of holding back the real frames
+            # behind it until the bogus length is reached.
+            frame_end = start + prefix_len + length
+            following = buf.find(COMMAND_HEADER, start + prefix_len)
+            if 0 <= following and following + header_len <= frame_end:
+                self.garbage_bytes += following - start
+                self.discarding = True
+                pos = start = following
+                continue
+            if frame_end > end:
+                self.searched = end - start
+                self.pending_end = frame_end - start
+                return start
+
+            if self.discarding:
+                self.discarding = False
+                self.resyncs += 1
+            self.frames += 1
+            handlers = self.handlers.get(frame_type)
+            if handlers:
+                with view[start + prefix_len : frame_end] as payload:
+                    for handler in handlers:
+                        try:
+                            handler(payload)
+                        except Exception:
+                            logging.exception("frame handler failed")
+            else:
+                self.unhandled += 1
+            pos = frame_end
+            if 0 <= following < frame_end:
+                # Only when the payload ends in the start of a header.
+                following = buf.find(COMMAND_HEADER, frame_end)
+            start = following
+
+
+class AudioRingBuffer:
+    """
+    Preallocated ring buffer for RX audio. Writes never block or grow the
+    buffer: when the reader falls behind, the oldest audio is overwritten and
+    counted in *overruns* / *overrun_bytes*.
+    """
+
+    def __init__(self, capacity: int = AUDIO_SAMPLE_RATE):
+        self.capacity = capacity
+        self.buf = bytearray(capacity)
+        self.view = memoryview(self.buf)
+        self.readable = asyncio.Event()
+        self.low_water = AUDIO_FRAME_SIZE
+        self.reset()
+
+    def reset(self):
+        # Positions are absolute byte counts, the ring offset is pos % capacity.
+        self.read_pos = 0
+        self.write_pos = 0
+        self.overruns = 0
+        self.overrun_bytes = 0
+        self.closed = False
+        self.readable.clear()
+
+    @property
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def write(self, data):
+        n = len(data)
+        if n == 0:
+            return
+
+        src = memoryview(data)
+        overflow = self.available + n - self.capacity
+        if overflow > 0:
+            self.overruns += 1
+            self.overrun_bytes += overflow
+            if n > self.capacity:
+                skip = n - self.capacity
+                src = src[skip:]
+                n = self.capacity
+                self.write_pos = self.read_pos = self.write_pos + skip
+            else:
+                self.read_pos += overflow
+
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.view[start : start + first] = src[:first]
+        if first < n:
+            self.view[: n - first] = src[first:]
+        self.write_pos += n
+
+        # Only wake the reader once a whole frame is waiting.
+        if self.available >= self.low_water:
+            self.readable.set()
+
+    def read_into(self, out) -> int:
+        n = min(len(out), self.available)
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.view[start : start + first]
+        if first < n:
+            out[first:n] = self.view[: n - first]
+        self.read_pos += n
+        return n
+
+    def close(self):
+        self.closed = True
+        self.readable.set()
+
+    async def frames(self, frame_size: int = AUDIO_FRAME_SIZE):
+        """
+        Yields frames of exactly *frame_size* bytes. The same bytearray is
+        reused for every frame, copy it if it must outlive the iteration.
+        """
+        frame = bytearray(frame_size)
+        self.low_water = frame_size
+        while not self.closed:
+            if self.available < frame_size:
+                self.readable.clear()
+                await self.readable.wait()
+                continue
+            self.read_into(frame)
+            yield frame
+
+
+class TxAudioStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.bytes_sent = 0
+        self.packets = 0
+        self.late_packets = 0
+        self.elapsed = 0.0
+        self.first_audio_latency = None
+
+    @property
+    def bytes_per_sec(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_sent / self.elapsed
+
+
+class TxAudioPipeline:
+    """
+    Frames a PCM source into packets of exactly the link's write size and
+    paces them so the radio receives *sample_rate* bytes per second, staying
+    at most *lead* seconds ahead of real time.
+
+    ``prepare()`` does the setup ahead of key-down, so the first packet goes
+    out as soon as ``run()`` starts. The time from PTT press to the first
+    audio byte written is kept in ``stats.first_audio_latency`` and logged
+    when it is over *first_audio_budget*.
+    """
+
+    first_audio_budget = 0.05
+
+    def __init__(self, device, sample_rate: int = AUDIO_SAMPLE_RATE, lead=0.05):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.lead = lead
+        self.stats = TxAudioStats()
+        self.packet = bytearray()
+        self.prepared = None
+
+    def prepare(self, source=None):
+        """
+        Allocates the packet buffer for the current link and, given
+        *source*, sets up packetizing it for the next ``run()``.
+        """
+        size = self.device.transport.max_write_size
+        if len(self.packet) != size:
+            self.packet = bytearray(size)
+        if source is not None:
+            self.prepared = (source, self.packets(source, size))
+
+    async def packets(self, source, size: int):
+        if not hasattr(source, "__aiter__"):
+            view = memoryview(source)
+            for i in range(0, len(view), size):
+                yield view[i : i + size]
+            return
+
+        if len(self.packet) != size:
+            self.packet = bytearray(size)
+        packet = self.packet
+        view = memoryview(packet)
+        fill = 0
+        async for data in source:
+            data = memoryview(data)
+            while data:
+                n = min(size - fill, len(data))
+                view[fill : fill + n] = data[:n]
+                fill += n
+                data = data[n:]
+                if fill == size:
+                    yield packet
+                    fill = 0
+        if fill:
+            yield view[:fill]
+
+    async def run(self, source=None):
+        prepared = self.prepared
+        if prepared is not None and (source is None or source is prepared[0]):
+            packets = prepared[1]
+        elif source is None:
+            raise ValueError("no audio source given or prepared")
+        else:
+            packets = self.packets(source, self.device.transport.max_write_size)
+        self.prepared = None
+        stats = self.stats
+        stats.reset()
+
+        loop = asyncio.get_running_loop()
+        started = start = loop.time()
+        async for packet in packets:
+            due = start + stats.bytes_sent / self.sample_rate - self.lead
+            now = loop.time()
+            if now < due:
+                await asyncio.sleep(due - now)
+            elif stats.packets and now > due + self.lead:
+                # The radio has already played everything we sent. Count it
+                # and restart the clock rather than bursting to catch up.
+                stats.late_packets += 1
+                start = now - stats.bytes_sent / self.sample_rate
+
+            await self.device.send_data(packet)
+            if not stats.packets:
+                self.first_packet_sent()
+            stats.bytes_sent += len(packet)
+            stats.packets += 1
+            stats.elapsed = loop.time() - started
+
+        return stats
+
+    def first_packet_sent(self):
+        pressed = self.device.ptt_pressed_at
+        if pressed is None:
+            return
+        self.device.ptt_pressed_at = None
+        latency = self.stats.first_audio_latency = time.perf_counter() - pressed
+        if self.device.metrics is not None:
+            self.device.metrics.add_latency("ptt_to_audio", latency)
+        if latency > self.first_audio_budget:
+            logging.warning(
+                "first audio %.1f ms after PTT, budget %.1f ms",
+                latency * 1000,
+                self.first_audio_budget * 1000,
+            )
+
+
+class FlowControl:
+    """
+    Window based flow control for writes without response. Once *window*
+    writes are outstanding, the next one is sent with response: that holds
+    the sender to what the peer has taken and measures the round trip. The
+    window grows by one while round trips stay near the fastest seen and
+    halves when they slow down; a failed acknowledged write also halves the
+    chunk size.
+    """
+
+    min_chunk_size = 20
+
+    def __init__(self, window=4, min_window=1, max_window=32):
+        self.initial_window = window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.reset()
+
+    def reset(self):
+        self.window = self.initial_window
+        self.chunk_limit = None
+        self.outstanding = 0
+        self.rtt = None
+        self.min_rtt = None
+        self.writes = 0
+        self.acked_writes = 0
+        self.bytes_sent = 0
+        self.retransmits = 0
+        self.drops_estimated = 0
+        self.started = time.monotonic()
+
+    def chunk_size(self, max_write_size: int) -> int:
+        if self.chunk_limit is None:
+            return max_write_size
+        return min(self.chunk_limit, max_write_size)
+
+    async def write(self, transport, chunk):
+        if transport.supports_response and self.outstanding >= self.window:
+            await self.write_acked(transport, chunk)
+        else:
+            await transport.write(chunk)
+            self.outstanding += 1
+        self.writes += 1
+        self.bytes_sent += len(chunk)
+
+    async def write_acked(self, transport, chunk):
+        started = time.monotonic()
+        try:
+            await transport.write(chunk, response=True)
+        except Exception as e:
+            logging.debug("acknowledged write failed (%s), retrying", e)
+            self.retransmits += 1
+            self.window = max(self.min_window, self.window // 2)
+            self.chunk_limit = max(self.min_chunk_size, len(chunk) // 2)
+            try:
+                await transport.write(chunk, response=True)
+            except Exception:
+                # Whatever was sent since the last acknowledgement is suspect.
+                self.drops_estimated += self.outstanding + 1
+                self.outstanding = 0
+                raise
+        rtt = time.monotonic() - started
+
+        self.acked_writes += 1
+        self.outstanding = 0
+        self.rtt = rtt if self.rtt is None else 0.875 * self.rtt + 0.125 * rtt
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+        if rtt > 2 * self.min_rtt:
+            self.window = max(self.min_window, self.window // 2)
+        else:
+            self.window = min(self.max_window, self.window + 1)
+            if self.chunk_limit is not None:
+                self.chunk_limit *= 2
+
+    @property
+    def throughput(self) -> float:
+        elapsed = time.monotonic() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.bytes_sent / elapsed
+
+    def stats(self) -> dict:
+        return {
+            "throughput": self.throughput,
+            "window": self.window,
+            "rtt": self.rtt,
+            "writes": self.writes,
+            "acked_writes": self.acked_writes,
+            "bytes_sent": self.bytes_sent,
+            "retransmits": self.retransmits,
+            "drops_estimated": self.drops_estimated,
+        }
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies in fixed log-spaced buckets, in seconds. Percentiles
+    are the upper bound of the bucket they fall in.
+    """
+
+    bounds = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        rank = p * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(map(str, self.bounds + ("inf",)), self.counts)),
+        }
+
+
+class DeviceMetrics:
+    """
+    Counters and latency histograms for a Kv4pHTDevice. Command latency is
+    measured from queueing to the end of the write that carried it; a keyed
+    command replaced while pending keeps the time of the first request.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = {}
+        self.send_data = LatencyHistogram()
+        self.commands = 0
+        self.dropped_commands = 0
+        self.failed_commands = 0
+        self.writes = 0
+        self.chunks = 0
+        self.bytes_sent = 0
+        self.notifications = 0
+        self.bytes_received = 0
+        self.notification_second = 0
+        self.notifications_this_second = 0
+        self.notifications_last_second = 0
+        self.connections = 0
+        self.connected_at = None
+        self.connected_total = 0.0
+
+    def commands_failed(self, entries):
+        self.failed_commands += len(entries)
+
+    def commands_sent(self, entries):
+        now = time.perf_counter()
+        for _, data, queued, _ in entries:
+            self.commands += 1
+            # Commands queued before metrics were enabled have no time.
+            if queued is None:
+                continue
+            self.add_latency(
+                COMMAND_NAMES.get(data[len(COMMAND_HEADER)], "other"), now - queued
+            )
+
+    def add_latency(self, name: str, seconds: float):
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = LatencyHistogram()
+        histogram.add(seconds)
+
+    def wrote(self, size: int, chunks: int, seconds: float):
+        self.writes += 1
+        self.chunks += chunks
+        self.bytes_sent += size
+        self.send_data.add(seconds)
+
+    def notified(self, size: int):
+        self.notifications += 1
+        self.bytes_received += size
+        second = int(time.monotonic())
+        if second != self.notification_second:
+            recent = second == self.notification_second + 1
+            self.notifications_last_second = (
+                self.notifications_this_second if recent else 0
+            )
+            self.notification_second = second
+            self.notifications_this_second = 0
+        self.notifications_this_second += 1
+
+    def connected(self):
+        self.connections += 1
+        self.connected_at = time.monotonic()
+
+    def disconnected(self):
+        if self.connected_at is not None:
+            self.connected_total += time.monotonic() - self.connected_at
+            self.connected_at = None
+
+    @property
+    def uptime(self) -> float:
+        if self.connected_at is None:
+            return 0.0
+        return time.monotonic() - self.connected_at
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        if int(now) > self.notification_second + 1:
+            notification_rate = 0
+        else:
+            notification_rate = self.notifications_last_second
+        return {
+            "time": time.time(),
+            "elapsed": now - self.started,
+            "uptime": self.uptime,
+            "connected_total": self.connected_total + self.uptime,
+            "connections": self.connections,
+            "commands": self.commands,
+            "dropped_commands": self.dropped_commands,
+            "failed_commands": self.failed_commands,
+            "writes": self.writes,
+            "chunks": self.chunks,
+            "bytes_sent": self.bytes_sent,
+            "notifications": self.notifications,
+            "notifications_per_sec": notification_rate,
+            "bytes_received": self.bytes_received,
+            "send_data": self.send_data.snapshot(),
+            "latency": {k: v.snapshot() for k, v in self.latency.items()},
+        }
+
+    async def dump_periodically(self, path: str, interval=10.0):
+        """
+        Appends a snapshot to *path* as one JSON line every *interval*
+        seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                with open(path, "a") as f:
+                    f.write(json.dumps(self.snapshot()) + "\n")
+            except OSError:
+                logging.exception("failed to write metrics")
+
+
+class Transport:
+    """
+    Link to a kv4p peripheral. ``connect`` registers *on_notify(sender, data)*
+    for notifications from the TX characteristic and *on_disconnect(transport)*
+    for link loss.
+    """
+
+    device = None
+    address = None
+    connected_via = None
+    supports_response = False
+
+    @property
+    def max_write_size(self) -> int:
+        raise NotImplementedError
+
+    async def connect(self, on_notify, on_disconnect) -> bool:
+        raise NotImplementedError
+
+    async def disconnect(self):
+        raise NotImplementedError
+
+    async def write(self, data, response: bool = False):
+        raise NotImplementedError
+
+
+class BleakTransport(Transport):
+    """
+    Transport over Bleak. When *address* is known it is tried first, and only
+    if that fails does it scan for a device matching ``match_nus_uuid``.
+    *ble_device*, a BLEDevice from an earlier scan, skips the lookup.
+    """
+
+    def __init__(
+        self,
+        address: str = None,
+        address_timeout=5.0,
+        scan_timeout=10.0,
+        ble_device: BLEDevice = None,
+    ):
+        self.address = address
+        self.ble_device = ble_device
+        self.address_timeout = address_timeout
+        self.scan_timeout = scan_timeout
         self.device = None
-        self.nus = None
         self.client = None
+        self.nus = None
+        self.rx_char = None
 
-    async def connect(self):
-        self.device = await BleakScanner.find_device_by_filter(match_nus_uuid)
-        if self.device is None:
+    @property
+    def max_write_size(self) -> int:
+        return self.rx_char.max_write_without_response_size
+
+    @property
+    def supports_response(self) -> bool:
+        return "write" in self.rx_char.properties
+
+    async def connect(self, on_notify, on_disconnect) -> bool:
+        from bleak import BleakScanner
+        from bleak.exc import BleakError
+
+        self.on_disconnect = on_disconnect
+        if self.address is not None:
+            try:
+                await self.open(
+                    self.ble_device or self.address, on_notify, self.address_timeout
+                )
+                self.connected_via = "address"
+                return True
+            except (BleakError, asyncio.TimeoutError) as e:
+                logging.info("could not connect to %s (%s), scanning", self.address, e)
+
+        # find_device_by_filter stops scanning at the first match.
+        device = await BleakScanner.find_device_by_filter(
+            match_nus_uuid, timeout=self.scan_timeout
+        )
+        if device is None:
             logging.warning(
                 "no matching device found, you may need to edit match_nus_uuid()."
             )
             return False
 
-        logging.info("Connecting to device %s", self.device)
+        await self.open(device, on_notify, self.scan_timeout)
+        self.connected_via = "scan"
+        return True
+
+    async def open(self, device, on_notify, timeout):
+        from bleak import BleakClient
 
-        self.client = BleakClient(
-            self.device,
+        logging.info("Connecting to device %s", device)
+        client = BleakClient(
+            device,
             disconnected_callback=self.handle_disconnect,
+            timeout=timeout,
         )
-        await self.client.connect()
+        await client.connect()
+        try:
+            await client.start_notify(UART_TX_CHAR_UUID, on_notify)
+        except Exception:
+            await client.disconnect()
+            raise
 
-        await self.client.start_notify(UART_TX_CHAR_UUID, self.handle_rx)
-        logging.info("Connected to device: %s", self.device)
-        self.nus = self.client.services.get_service(UART_SERVICE_UUID)
+        self.client = client
+        self.device = device
+        self.address = client.address
+        self.nus = client.services.get_service(UART_SERVICE_UUID)
         self.rx_char = self.nus.get_characteristic(UART_RX_CHAR_UUID)
 
+    async def disconnect(self):
+        if self.client is not None:
+            await self.client.disconnect()
+
+    def handle_disconnect(self, client: BleakClient):
+        if client is not self.client:
+            return
+        self.device = None
+        self.client = None
+        self.nus = None
+        self.rx_char = None
+        self.on_disconnect(self)
+
+    async def write(self, data, response: bool = False):
+        await self.client.write_gatt_char(self.rx_char, data, response=response)
+
+
+class Kv4pHTDevice:
+    max_batch_size = 512
+    reconnect_delay = 0.5
+    reconnect_max_delay = 30.0
+    request_timeout = 2.0
+
+    def __init__(self, transport: Transport = None, address: str = None, metrics=False):
+        self.transport = transport
+        self.address = address
+        # None when off, so every hook is a single attribute check.
+        self.metrics = DeviceMetrics() if metrics else None
+        self.metrics_dumper = None
+        self.device = None
+        self.auto_reconnect = True
+        self.closing = False
+        self.reconnector = None
+        self.connect_lock = asyncio.Lock()
+        self.connect_times = deque(maxlen=32)
+        self.state = {}
+        self.rx_audio = AudioRingBuffer()
+        self.tx_audio = TxAudioPipeline(self)
+        self.firmware_version = None
+        self.firmware_versions = {}
+        self.status = None
+        # Futures of requests awaiting a reply, oldest first, by
+        # (frame type, tag) of the reply that answers them.
+        self.pending_requests = {}
+        self.encoder = CommandEncoder()
+        self.commands = CommandQueue()
+        self.writer = None
+        self.write_lock = WriteLock()
+        self.ptt_pressed_at = None
+        # Called as listener(device, connected) on every connect and drop.
+        self.connection_listeners = []
+        self.flow = FlowControl()
+        self.parser = FrameParser()
+        self.parser.add_handler(FRAME_AUDIO, self.rx_audio.write)
+        self.parser.add_handler(FRAME_FIRMWARE_VERSION, self.handle_firmware_version)
+        self.parser.add_handler(FRAME_STATUS, self.handle_status)
+
+    def notify_connection(self, connected: bool):
+        for listener in list(self.connection_listeners):
+            try:
+                listener(self, connected)
+            except Exception:
+                logging.exception("connection listener failed")
+
+    async def connect(self):
+        """
+        Connects unless already connected. Connects run one at a time, so
+        there is never a second writer on the queue or a second attach of
+        the transport.
+        """
+        if self.connected:
+            return True
+        if (
+            self.reconnector is not None
+            and self.reconnector is not asyncio.current_task()
+        ):
+            self.reconnector.cancel()
+            self.reconnector = None
+        async with self.connect_lock:
+            if self.connected:
+                return True
+            return await self.open_connection()
+
+    async def open_connection(self):
+        if self.transport is None:
+            self.transport = BleakTransport(self.address)
+
+        self.closing = False
+        self.rx_audio.reset()
+        self.parser.reset()
+        self.flow.reset()
+        started = time.monotonic()
+        connected = False
+        try:
+            connected = await self.transport.connect(
+                self.handle_rx, self.handle_disconnect
+            )
+        finally:
+            self.connect_times.append(
+                {
+                    "via": self.transport.connected_via if connected else None,
+                    "seconds": time.monotonic() - started,
+                    "connected": connected,
+                }
+            )
+        if not connected:
+            return False
+        if self.closing:
+            # disconnect() was called while the link came up.
+            logging.info("disconnected while connecting, closing the link")
+            await self.transport.disconnect()
+            return False
+
+        self.device = self.transport.device
+        self.address = self.transport.address
+        logging.info(
+            "Connected to device: %s via %s in %.2fs",
+            self.device,
+            self.transport.connected_via,
+            self.connect_times[-1]["seconds"],
+        )
+        if self.metrics is not None:
+            self.metrics.connected()
+        # Bring the radio back to the last requested tune and filters.
+        for key, data in self.state.items():
+            self.commands.put(data, key)
+        self.writer = asyncio.create_task(self.write_commands())
+        # Have TX ready before the first key-down.
+        self.tx_audio.prepare()
+        self.notify_connection(True)
+        return True
+
+    async def disconnect(self):
+        self.closing = True
+        if self.reconnector is not None:
+            self.reconnector.cancel()
+            self.reconnector = None
+        if self.transport is not None:
+            await self.transport.disconnect()
+
+    async def reconnect(self):
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                if await self.connect():
+                    self.reconnector = None
+                    return
+            except Exception as e:
+                logging.warning("reconnect failed: %s", e)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
     def match_nus_uuid(device: BLEDevice, adv: AdvertisementData):
         # This assumes that the device includes the UART service UUID in the
         # advertising data. This test may need to be adjusted depending on the
@@ -75,30 +1156,253 @@ class Kv4pHTDevice:
 
         return False
 
-    def handle_disconnect(self, _: BleakClient):
+    def handle_disconnect(self, _: Transport):
         logging.info("Disconnected to device: %s", self.device)
-        self.rx_char = None
+        was_connected = self.writer is not None
         self.device = None
-        self.nus = None
-        self.client = None
+        self.rx_audio.close()
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+        # Keep pending state (tune, filters) for the next connection, but
+        # never replay one-shot commands such as PTT.
+        self.commands.discard_unkeyed()
+        self.fail_requests(ConnectionError("disconnected"))
+        if self.metrics is not None:
+            self.metrics.disconnected()
+        if was_connected:
+            self.notify_connection(False)
+        if self.auto_reconnect and not self.closing and self.reconnector is None:
+            self.reconnector = asyncio.ensure_future(self.reconnect())
 
     def handle_rx(self, _: BleakGATTCharacteristic, data: bytearray):
-        print("received:", data)
-        pass
+        if self.metrics is not None:
+            self.metrics.notified(len(data))
+        self.parser.feed(data)
+
+    def handle_firmware_version(self, payload: memoryview):
+        # The band byte echoes the request, older firmware may leave it out.
+        band = None
+        if payload[:1] in (b"u", b"v"):
+            band = chr(payload[0])
+            payload = payload[1:]
+        version = bytes(payload).decode("ASCII", errors="replace")
+        self.firmware_version = version
+        self.firmware_versions[band] = version
+        logging.info("firmware version (%s): %s", band, version)
+        self.resolve(FRAME_FIRMWARE_VERSION, band, version)
+
+    async def request(self, data: bytes, frame_type: int, tag=None, timeout=None):
+        """
+        Sends *data* and waits for the inbound *frame_type* frame carrying
+        *tag* that answers it, returning what its handler passes to
+        ``resolve()``. Any number of requests can be in flight; replies with
+        the same type and tag answer them in order. Raises
+        asyncio.TimeoutError after *timeout* (default ``request_timeout``)
+        seconds and ConnectionError if the link drops first.
+        """
+        if self.writer is None:
+            raise ConnectionError("not connected")
+        future = asyncio.get_running_loop().create_future()
+        key = (frame_type, tag)
+        waiters = self.pending_requests.setdefault(key, deque())
+        waiters.append(future)
+        started = time.perf_counter()
+        try:
+            self.queue_command(data)
+            result = await asyncio.wait_for(
+                future, self.request_timeout if timeout is None else timeout
+            )
+        finally:
+            # Timed out or cancelled, forget it so a late reply is not
+            # handed to the next request.
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters and self.pending_requests.get(key) is waiters:
+                del self.pending_requests[key]
+        if self.metrics is not None:
+            name = COMMAND_NAMES.get(data[len(COMMAND_HEADER)], "other")
+            self.metrics.add_latency(name + "_reply", time.perf_counter() - started)
+        return result
+
+    def resolve(self, frame_type: int, tag, result) -> bool:
+        """
+        Answers the oldest request waiting for *frame_type* and *tag*. A
+        reply without a tag answers the oldest request of that type.
+        """
+        if tag is None:
+            keys = [key for key in self.pending_requests if key[0] == frame_type]
+        else:
+            keys = [(frame_type, tag)]
+        for key in keys:
+            waiters = self.pending_requests.get(key)
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(result)
+                    return True
+        return False
+
+    def fail_requests(self, exc: Exception):
+        for waiters in self.pending_requests.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_exception(exc)
+        self.pending_requests.clear()
+
+    def handle_status(self, payload: memoryview):
+        self.status = bytes(payload)
+        logging.debug("status: %s", self.status)
 
-    async def send_data(self, data: bytearray):
-        for s in sliced(data, self.rx_char.max_write_without_response_size):
-            await self.client.write_gatt_char(self.rx_char, s, response=False)
+    async def send_data(self, data: bytearray, priority=False):
+        # Hold the lock for the whole message so a command split over several
+        # writes is never interleaved with audio packets.
+        await self.write_lock.acquire(priority)
+        try:
+            metrics = self.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+            flow = self.flow
+            size = flow.chunk_size(self.transport.max_write_size)
+            for s in sliced(data, size):
+                await flow.write(self.transport, s)
+            if metrics is not None:
+                metrics.wrote(
+                    len(data), -(-len(data) // size), time.perf_counter() - started
+                )
+        finally:
+            self.write_lock.release()
+
+    async def send_priority(self, data: bytes):
+        """
+        Writes *data* now, ahead of queued commands and of audio packets
+        waiting for the link, instead of going through the writer task.
+        """
+        if self.writer is None:
+            logging.warning("not connected, dropping command")
+            if self.metrics is not None:
+                self.metrics.dropped_commands += 1
+            return
+        started = time.perf_counter()
+        try:
+            await self.send_data(data, priority=True)
+        except Exception:
+            logging.exception("failed to send priority command")
+            if self.metrics is not None:
+                self.metrics.failed_commands += 1
+            return
+        if self.metrics is not None:
+            self.metrics.commands += 1
+            self.metrics.add_latency(
+                COMMAND_NAMES[data[len(COMMAND_HEADER)]],
+                time.perf_counter() - started,
+            )
+
+    async def write_commands(self):
+        """
+        The single writer task. Takes everything queued since the last write
+        and sends it back to back, so bursts of commands share writes.
+        """
+        batch = self.encoder
+        entries = []
+        while True:
+            batch.clear()
+            entries.clear()
+            await self.commands.wait()
+            while self.commands and batch.length < self.max_batch_size:
+                entry = self.commands.pop()
+                batch.append(entry[1])
+                entries.append(entry)
+
+            try:
+                await self.send_data(batch.getvalue())
+            except asyncio.CancelledError:
+                resolve_sent(entries, False)
+                raise
+            except Exception:
+                logging.exception("failed to send commands")
+                resolve_sent(entries, False)
+                if self.metrics is not None:
+                    self.metrics.commands_failed(entries)
+                continue
+            resolve_sent(entries, True)
+            if self.metrics is not None:
+                self.metrics.commands_sent(entries)
+
+    def queue_command(self, data: bytes, key=None, sent=None):
+        """
+        Queues *data* for the writer task. *sent*, an optional future, is
+        resolved to whether the command was actually written.
+        """
+        if key is not None:
+            self.state[key] = data
+        elif self.writer is None:
+            logging.warning("not connected, dropping command")
+            if self.metrics is not None:
+                self.metrics.dropped_commands += 1
+            if sent is not None:
+                sent.set_result(False)
+            return
+        queued_at = time.perf_counter() if self.metrics is not None else None
+        self.commands.put(data, key, queued_at, sent)
+
+    def enable_metrics(self, dump_path: str = None, dump_interval=10.0):
+        """
+        Starts collecting metrics, and with *dump_path* appends a snapshot
+        to that file as a JSON line every *dump_interval* seconds.
+        """
+        if self.metrics is None:
+            self.metrics = DeviceMetrics()
+            if self.writer is not None:
+                self.metrics.connected()
+        if dump_path is not None and self.metrics_dumper is None:
+            self.metrics_dumper = asyncio.ensure_future(
+                self.metrics.dump_periodically(dump_path, dump_interval)
+            )
+
+    def disable_metrics(self):
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.cancel()
+            self.metrics_dumper = None
+        self.metrics = None
+
+    def get_metrics(self):
+        """
+        A snapshot of the metrics as a dict, or None when they are off.
+        """
+        if self.metrics is None:
+            return None
+        return self.metrics.snapshot()
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.commands)
+
+    @property
+    def coalesced_drops(self) -> int:
+        return self.commands.coalesced
+
+    async def send_batch(self, batch: CommandEncoder):
+        """
+        Queues every command packed into *batch* to be sent back to back,
+        split only at the MTU.
+        """
+        logging.debug("sending batch of %d bytes", batch.length)
+        self.queue_command(batch.getvalue())
 
     async def cmd_ptt_down(self):
-        data = COMMAND_HEADER + bytearray([0x01])
         logging.debug("sending ptt_down")
-        await self.send_data(data)
+        self.ptt_pressed_at = time.perf_counter()
+        await self.send_priority(PTT_DOWN_PACKET)
 
     async def cmd_ptt_up(self):
-        data = COMMAND_HEADER + bytearray([0x02])
         logging.debug("sending ptt_up")
-        await self.send_data(data)
+        self.ptt_pressed_at = None
+        await self.send_priority(PTT_UP_PACKET)
 
     async def cmd_tune_to(
         self,
@@ -123,51 +1427,126 @@ class Kv4pHTDevice:
         # if bandwidth != "w" or bandwidth != "n":
         #     return 1
 
-        data = (
-            COMMAND_HEADER
-            + bytearray([0x03])
-            + bytearray(f"{tx_freq:8.4f}".encode(encoding="ASCII"))
-            + bytearray(f"{rx_freq:8.4f}".encode(encoding="ASCII"))
-            + bytearray(f"{tone:02d}".encode(encoding="ASCII"))
-            + bytearray(f"{squelch:d}".encode(encoding="ASCII"))
-            + bytearray(f"{bandwidth}".encode(encoding="ASCII"))
-        )
-        logging.debug("sending tune_to", data)
-        await self.send_data(data)
+        data = encode_tune_to(tx_freq, rx_freq, tone, squelch, bandwidth)
+        logging.debug("sending tune_to %s", data)
+        self.queue_command(data, key=CMD_TUNE_TO)
 
     async def cmd_filters(self, emphasis: bool, high: bool, low: bool):
-        data = (
-            COMMAND_HEADER
-            + bytearray([0x04])
-            + bytearray(f"{emphasis:1d}".encode(encoding="ASCII"))
-            + bytearray(f"{high:1d}".encode(encoding="ASCII"))
-            + bytearray(f"{low:1d}".encode(encoding="ASCII"))
-        )
         logging.debug("sending filters")
-        await self.send_data(data)
+        self.queue_command(encode_filters(emphasis, high, low), key=CMD_FILTERS)
+
+    async def cmd_configure(
+        self,
+        tx_freq: float,
+        rx_freq: float,
+        tone: int,
+        squelch: int,
+        bandwidth: str,
+        emphasis: bool,
+        high: bool,
+        low: bool,
+    ):
+        # Both are queued together and go out in the same write.
+        await self.cmd_tune_to(tx_freq, rx_freq, tone, squelch, bandwidth)
+        await self.cmd_filters(emphasis, high, low)
 
     async def cmd_stop(self):
-        data = COMMAND_HEADER + bytearray([0x05])
         logging.debug("sending stop")
-        await self.send_data(data)
+        await self.send_priority(STOP_PACKET)
 
-    async def cmd_get_firmware_ver(self, band: str):
-        if band != "u" or band != "v":
-            return 1
+    async def cmd_get_firmware_ver(self, band: str, timeout=None) -> str:
+        """
+        Returns the firmware version reported for *band*, "u" or "v".
+        """
+        if band not in ("u", "v"):
+            raise ValueError(f"band must be 'u' or 'v', not {band!r}")
 
-        data = (
-            COMMAND_HEADER
-            + bytearray([0x06])
-            + bytearray(band.encode(encoding="ASCII"))
-        )
         logging.debug("sending get_firmware_ver")
-        await self.send_data(data)
+        return await self.request(
+            encode_get_firmware_ver(band), FRAME_FIRMWARE_VERSION, band, timeout
+        )
+
+    async def get_firmware_versions(self, timeout=None) -> dict:
+        """
+        Both bands' firmware versions. The requests go out together, so
+        this takes one round trip.
+        """
+        u, v = await asyncio.gather(
+            self.cmd_get_firmware_ver("u", timeout),
+            self.cmd_get_firmware_ver("v", timeout),
+        )
+        return {"u": u, "v": v}
+
+    async def send_audio(self, source=None):
+        """
+        Transmits *source*, either an async iterator of PCM chunks or a
+        bytes-like buffer, paced at the audio sample rate. Without *source*
+        sends the one given to ``tx_audio.prepare()``. Returns the pipeline
+        stats (``bytes_per_sec``, ``late_packets``, ``first_audio_latency``).
+        """
+        return await self.tx_audio.run(source)
+
+    async def transmit(self, source=None):
+        """
+        Keys up, sends *source* and unkeys, even if sending fails.
+        """
+        if source is not None:
+            self.tx_audio.prepare(source)
+        await self.cmd_ptt_down()
+        try:
+            return await self.send_audio()
+        finally:
+            await self.cmd_ptt_up()
+
+    def receive_audio(self, frame_size: int = AUDIO_FRAME_SIZE):
+        """
+        Returns an async iterator of RX audio frames of *frame_size* bytes.
+        The iterator ends when the device disconnects. Audio the consumer did
+        not keep up with is dropped and counted in ``rx_audio.overruns``.
+        """
+        return self.rx_audio.frames(frame_size)
 
-    def send_audio():
-        pass
 
-    def receive_audio():
-        pass
+ctcss_tone_list = [
+    67.0,
+    71.9,
+    74.4,
+    77.0,
+    79.7,
+    82.5,
+    85.4,
+    88.5,
+    91.5,
+    94.8,
+    97.4,
+    100.0,
+    103.5,
+    107.2,
+    110.9,
+    114.8,
+    118.8,
+    123.0,
+    127.3,
+    131.8,
+    136.5,
+    141.3,
+    146.2,
+    151.4,
+    156.7,
+    162.2,
+    167.9,
+    173.8,
+    179.9,
+    186.2,
+    192.8,
+    203.5,
+    210.7,
+    218.1,
+    225.7,
+    233.6,
+    241.8,
+    250.3,
+]
 
 
 def check_frequency_range(n):
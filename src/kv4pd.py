@@ -0,0 +1,348 @@
+"""
+Headless kv4p daemon: owns the radio connection and serves a local control
+API as line-delimited JSON over localhost TCP or a Unix socket.
+
+    python src/kv4pd.py --port 8765
+    python src/kv4pd.py --unix /tmp/kv4pd.sock --address AA:BB:CC:DD:EE:FF
+
+Each request is one JSON object per line with an optional "id" that is
+echoed in its response, so clients can pipeline requests without waiting:
+
+    {"id": 1, "cmd": "tune", "rx_freq": 146.52, "tone": 0, "squelch": 4}
+    {"id": 2, "cmd": "ptt_down"}
+
+Responses are {"id": ..., "ok": true, "result": ...} or {"id": ...,
+"ok": false, "error": "..."}. Events such as {"event": "connected"} are
+sent to every client. A client that reads too slowly loses events, and is
+disconnected if it cannot even take its responses, so it never holds up
+the radio or other clients.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from kv4p import FRAME_STATUS, Kv4pHTDevice
+
+
+class ClientConnection:
+    """
+    One API client. Outgoing lines wait in a queue of at most *queue_size*
+    messages drained by a writer task.
+    """
+
+    def __init__(self, reader, writer, queue_size=1024):
+        self.reader = reader
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.peer = writer.get_extra_info("peername") or "unix"
+        self.requests = 0
+        self.dropped_events = 0
+        self.closed = False
+
+    def send(self, line: bytes, event=False) -> bool:
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except asyncio.QueueFull:
+            if event:
+                self.dropped_events += 1
+            else:
+                logging.warning("client %s is not reading, closing it", self.peer)
+                self.close()
+            return False
+
+    def respond(self, request_id, result=None, error=None):
+        if error is None:
+            message = {"id": request_id, "ok": True, "result": result}
+        else:
+            message = {"id": request_id, "ok": False, "error": error}
+        self.send(json.dumps(message).encode() + b"\n")
+
+    async def write_lines(self):
+        try:
+            while True:
+                line = await self.queue.get()
+                self.writer.write(line)
+                # Only wait on the socket when its buffer fills up.
+                if self.queue.empty() or self.writer.transport.get_write_buffer_size():
+                    await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class Daemon:
+    """
+    Serves the control API for *device*. Requests are handled in the order
+    each client sends them; a scan runs in the background so requests after
+    it keep flowing. With *audio*, an AudioServer, ``status`` also reports
+    its per-listener counters.
+    """
+
+    def __init__(self, device: Kv4pHTDevice, queue_size=1024, audio=None):
+        self.device = device
+        self.audio = audio
+        self.queue_size = queue_size
+        self.clients = set()
+        self.scanner = None
+        self.scan_task = None
+        self.device.parser.add_handler(FRAME_STATUS, self.handle_status)
+        self.device.connection_listeners.append(self.handle_connection)
+
+    def emit(self, event: str, **fields):
+        line = json.dumps({"event": event, **fields}).encode() + b"\n"
+        for client in list(self.clients):
+            client.send(line, event=True)
+
+    def handle_status(self, payload: memoryview):
+        self.emit("status", data=bytes(payload).hex())
+
+    def handle_connection(self, device, connected: bool):
+        # Every change is reported, including drops and auto-reconnects.
+        self.emit("connected" if connected else "disconnected", address=device.address)
+
+    async def handle_client(self, reader, writer):
+        client = ClientConnection(reader, writer, self.queue_size)
+        self.clients.add(client)
+        writer_task = asyncio.ensure_future(client.write_lines())
+        logging.info("client %s connected", client.peer)
+        try:
+            while not client.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    await self.handle_line(client, line)
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            writer_task.cancel()
+            client.close()
+            logging.info(
+                "client %s gone after %d requests, %d events dropped",
+                client.peer,
+                client.requests,
+                client.dropped_events,
+            )
+
+    async def handle_line(self, client: ClientConnection, line: bytes):
+        client.requests += 1
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            client.respond(None, error=f"invalid JSON: {e}")
+            return
+        if not isinstance(request, dict):
+            client.respond(None, error="request must be an object")
+            return
+
+        request_id = request.get("id")
+        handler = getattr(self, "cmd_" + str(request.get("cmd")), None)
+        if handler is None:
+            client.respond(request_id, error=f"unknown cmd {request.get('cmd')!r}")
+            return
+        try:
+            result = await handler(request)
+        except (KeyError, TypeError, ValueError) as e:
+            client.respond(request_id, error=f"bad request: {e!r}")
+        except Exception as e:
+            logging.exception("request %r failed", request)
+            client.respond(request_id, error=str(e))
+        else:
+            client.respond(request_id, result)
+
+    async def cmd_ping(self, request):
+        return "pong"
+
+    async def cmd_status(self, request):
+        return {
+            "connected": self.device.connected,
+            "address": self.device.address,
+            "queue_depth": self.device.queue_depth,
+            "coalesced_drops": self.device.coalesced_drops,
+            "firmware_version": self.device.firmware_version,
+            "scanning": self.scan_task is not None,
+            "clients": len(self.clients),
+            "metrics": self.device.get_metrics(),
+            "audio": self.audio.stats() if self.audio is not None else None,
+        }
+
+    async def cmd_connect(self, request):
+        return await self.device.connect()
+
+    async def cmd_disconnect(self, request):
+        await self.device.disconnect()
+
+    async def cmd_tune(self, request):
+        rx_freq = float(request["rx_freq"])
+        await self.device.cmd_tune_to(
+            float(request.get("tx_freq", rx_freq)),
+            rx_freq,
+            int(request.get("tone", 0)),
+            int(request.get("squelch", 4)),
+            str(request.get("bandwidth", "N")),
+        )
+
+    async def cmd_filters(self, request):
+        await self.device.cmd_filters(
+            bool(request.get("emphasis", False)),
+            bool(request.get("high", False)),
+            bool(request.get("low", False)),
+        )
+
+    async def cmd_ptt_down(self, request):
+        await self.device.cmd_ptt_down()
+
+    async def cmd_ptt_up(self, request):
+        await self.device.cmd_ptt_up()
+
+    async def cmd_stop(self, request):
+        await self.device.cmd_stop()
+
+    async def cmd_firmware_version(self, request):
+        """
+        One band's version with *band*, otherwise both.
+        """
+        if "band" in request:
+            return await self.device.cmd_get_firmware_ver(str(request["band"]))
+        return await self.device.get_firmware_versions()
+
+    async def cmd_scan(self, request):
+        """
+        Starts scanning *channels* (rx frequencies) or *start*..*stop* every
+        *step* MHz. The outcome arrives as a "scan_stopped" event.
+        """
+        from scanner import Channel, Scanner, channels_from_range
+
+        if self.scan_task is not None:
+            raise ValueError("already scanning")
+        tone = int(request.get("tone", 0))
+        squelch = int(request.get("squelch", 4))
+        bandwidth = str(request.get("bandwidth", "N"))
+        if "channels" in request:
+            channels = [
+                Channel(float(f), tone=tone, squelch=squelch, bandwidth=bandwidth)
+                for f in request["channels"]
+            ]
+        else:
+            channels = channels_from_range(
+                float(request["start"]),
+                float(request["stop"]),
+                float(request["step"]),
+                tone,
+                squelch,
+                bandwidth,
+            )
+        self.scanner = Scanner(
+            self.device,
+            float(request.get("dwell", 0.1)),
+            float(request.get("threshold", 8.0)),
+        )
+        self.scan_task = asyncio.ensure_future(
+            self.run_scan(channels, bool(request.get("repeat", True)))
+        )
+        return {"channels": len(channels)}
+
+    async def run_scan(self, channels, repeat):
+        found = None
+        try:
+            found = await self.scanner.scan(channels, repeat)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            stats = self.scanner.stats
+            self.emit(
+                "scan_stopped",
+                rx_freq=found.rx_freq if found else None,
+                channels=stats.channels,
+                channels_per_sec=stats.channels_per_sec,
+            )
+            self.scan_task = None
+
+    async def cmd_scan_stop(self, request):
+        if self.scan_task is None:
+            return False
+        self.scan_task.cancel()
+        return True
+
+
+async def serve(args):
+    if args.simulate:
+        from simulator import SimulatedPeripheral, SimulatedTransport
+
+        transport = SimulatedTransport(
+            SimulatedPeripheral(active_frequencies=args.simulate_active)
+        )
+        device = Kv4pHTDevice(transport, metrics=args.metrics)
+    else:
+        device = Kv4pHTDevice(address=args.address, metrics=args.metrics)
+    audio = None
+    if args.audio_udp_port or args.audio_websocket_port:
+        from audio_server import AudioServer
+
+        audio = AudioServer(
+            device, args.host, args.audio_udp_port, args.audio_websocket_port
+        )
+        await audio.start()
+    daemon = Daemon(device, args.queue_size, audio)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = await asyncio.start_unix_server(daemon.handle_client, args.unix)
+        where = args.unix
+    else:
+        server = await asyncio.start_server(daemon.handle_client, args.host, args.port)
+        where = f"{args.host}:{args.port}"
+    logging.info("listening on %s", where)
+
+    if not args.no_connect and not await device.connect():
+        logging.warning("radio not connected, use the connect command to retry")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if audio is not None:
+            await audio.stop()
+        await device.disconnect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--address", help="radio BLE address, scans if omitted")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead")
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--audio-udp-port", type=int, default=0, metavar="PORT")
+    parser.add_argument("--audio-websocket-port", type=int, default=0, metavar="PORT")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics")
+    parser.add_argument("--no-connect", action="store_true")
+    parser.add_argument("--simulate", action="store_true", help="use a simulator")
+    parser.add_argument(
+        "--simulate-active", type=float, nargs="*", default=[], metavar="MHZ"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,58 @@
+import time
+
+STARTED = time.perf_counter()
+
 import flet as ft
 import logging
-from kv4p import Kv4pHTDevice
+import math
+import os
+from chirp import export_chirp, import_chirp
+from kv4p import Kv4pHTDevice, ctcss_tone_list
+from manager import DeviceManager
+from presets import PresetStore
+from recorder import Recorder
+from settings import SettingsStore
+from ui_scheduler import UiScheduler
 
 SETTINGS_KEY_PREFIX = "kv4p-app-state."
 PRESETS_KEY_PREFIX = "kv4p-app-presets."
+DEVICE_ADDRESS_KEY = "kv4p-app-device.address"
+RECORDINGS_DIR = os.path.join(os.path.expanduser("~"), "kv4p-recordings")
+
+STARTUP_TIMES = {"import": time.perf_counter() - STARTED}
 
-bleDevice = Kv4pHTDevice()
+# Created in main(), so importing this module stays cheap. bleDevice is the
+# radio the Connect button drives, commands go to every selected radio.
+bleDevice = None
+radios = None
+
+
+def mark_startup(stage):
+    STARTUP_TIMES[stage] = time.perf_counter() - STARTED
+    if "first_frame" in STARTUP_TIMES and "interactive" in STARTUP_TIMES:
+        logging.info(
+            "startup: import %.0f ms, first frame %.0f ms, interactive %.0f ms",
+            STARTUP_TIMES["import"] * 1000,
+            STARTUP_TIMES["first_frame"] * 1000,
+            STARTUP_TIMES["interactive"] * 1000,
+        )
 
 
 class FrequencyControlWidget(ft.Row):
-    def __init__(self, key, text, client_storage):
+    def __init__(self, key, text, settings):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + key
         self.step = 0.0010
-        self.client_storage = client_storage
-
-        if not self.client_storage.contains_key(self.key):
-            self.client_storage.set(self.key, 143.0000)
+        self.settings = settings
+        self.settings.setdefault(self.key, 143.0000)
 
         self.btn_dec_freq = ft.Button(
             content=ft.Icon(ft.Icons.ARROW_BACK),
             on_click=self.handle_dec_freq,
         )
         self.txt_freq = ft.TextField(
-            value=f"{self.client_storage.get(self.key):8.4f}",
+            value=f"{self.settings.get(self.key):8.4f}",
             keyboard_type=ft.KeyboardType.NUMBER,
             text_align=ft.TextAlign.CENTER,
             expand=True,
@@ -43,16 +71,16 @@ class FrequencyControlWidget(ft.Row):
         self.expand = True
 
     async def handle_dec_freq(self, e):
-        value = await self.client_storage.get_async(self.key)
-        await self.client_storage.set_async(self.key, round(value - self.step, 4))
-        self.txt_freq.value = f"{await self.client_storage.get_async(self.key):8.4f}"
+        value = round(self.settings.get(self.key) - self.step, 4)
+        self.settings.set(self.key, value)
+        self.txt_freq.value = f"{value:8.4f}"
         self.update()
         await self.parent.tune()
 
     async def handle_inc_freq(self, e):
-        value = await self.client_storage.get_async(self.key)
-        await self.client_storage.set_async(self.key, round(value + self.step, 4))
-        self.txt_freq.value = f"{await self.client_storage.get_async(self.key):8.4f}"
+        value = round(self.settings.get(self.key) + self.step, 4)
+        self.settings.set(self.key, value)
+        self.txt_freq.value = f"{value:8.4f}"
         self.update()
         await self.parent.tune()
 
@@ -60,29 +88,68 @@ class FrequencyControlWidget(ft.Row):
         self.txt_freq.value = f"{value:8.4f}"
         self.update()
 
-    async def get_value(self):
-        value = await self.client_storage.get_async(self.key)
-        return value
+    def get_value(self):
+        return self.settings.get(self.key)
+
+
+class RadiosMenu(ft.PopupMenuButton):
+    def __init__(self, radios):
+        super().__init__(icon=ft.Icons.RADIO, tooltip="Radios")
+
+        self.radios = radios
+        self.mounted = False
+        self.radios.listeners.append(self.handle_radios)
+        self.set_items()
+
+    def did_mount(self):
+        self.mounted = True
+
+    def will_unmount(self):
+        self.mounted = False
+
+    def set_items(self):
+        self.items = [
+            ft.PopupMenuItem(
+                text="Scan for radios", icon=ft.Icons.SEARCH, on_click=self.handle_scan
+            ),
+            ft.PopupMenuItem(),
+        ]
+        for device in self.radios:
+            name = device.address or "Radio"
+            if not device.connected:
+                name += " (offline)"
+            self.items.append(
+                ft.PopupMenuItem(
+                    text=name,
+                    checked=device in self.radios.selected,
+                    on_click=lambda e, device=device: self.radios.select(
+                        device, device not in self.radios.selected
+                    ),
+                )
+            )
+
+    def handle_radios(self, _):
+        self.set_items()
+        if self.mounted:
+            self.update()
+
+    async def handle_scan(self, e):
+        found = await self.radios.discover()
+        await self.radios.connect_all(found)
 
 
 class TuningWidget(ft.Column):
-    def __init__(self, client_storage):
+    def __init__(self, settings, recorder):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + "rx_tx_split"
-        self.client_storage = client_storage
-        self.rx_freq = FrequencyControlWidget(
-            "rx_freq", "Rx Frequency:", client_storage
-        )
-        self.tx_freq = FrequencyControlWidget(
-            "tx_freq", "Tx Frequency:", client_storage
-        )
+        self.settings = settings
+        self.recorder = recorder
+        self.rx_freq = FrequencyControlWidget("rx_freq", "Rx Frequency:", settings)
+        self.tx_freq = FrequencyControlWidget("tx_freq", "Tx Frequency:", settings)
         self.btn_split = ft.Switch("Split Tx Frequency", on_change=self.handle_split)
 
-        if not self.client_storage.contains_key(self.key):
-            self.client_storage.set(self.key, False)
-
-        split = self.client_storage.get(self.key)
+        split = self.settings.setdefault(self.key, False)
         if split:
             self.btn_split.icon = ft.Icons.LOCK_OPEN
             self.tx_freq.disabled = False
@@ -92,9 +159,9 @@ class TuningWidget(ft.Column):
             self.tx_freq.disabled = True
             self.tx_freq.visible = False
 
-        self.w_tone = ToneWidget(client_storage)
-        self.w_squelch = SquelchWidget(client_storage)
-        self.w_bandwidth = BandwidthWidget(client_storage)
+        self.w_tone = ToneWidget(settings)
+        self.w_squelch = SquelchWidget(settings)
+        self.w_bandwidth = BandwidthWidget(settings)
 
         self.controls = [
             self.rx_freq,
@@ -104,10 +171,11 @@ class TuningWidget(ft.Column):
             self.w_tone,
             self.w_squelch,
         ]
+        self.recorder.set_channel(self.rx_freq.get_value(), self.w_tone.get_value())
 
     async def handle_split(self, e):
         value = e.control.value
-        self.client_storage.set(self.key, value)
+        self.settings.set(self.key, value)
 
         if value:
             self.tx_freq.disabled = False
@@ -116,31 +184,30 @@ class TuningWidget(ft.Column):
             self.tx_freq.disabled = True
             self.tx_freq.visible = False
 
-        self.tx_freq.set_value(await self.rx_freq.get_value())
+        self.tx_freq.set_value(self.rx_freq.get_value())
         self.update()
 
     async def tune(self):
-        await bleDevice.cmd_tune_to(
-            await self.tx_freq.get_value(),
-            await self.rx_freq.get_value(),
-            await self.w_tone.get_value(),
-            await self.w_squelch.get_value(),
-            await self.w_bandwidth.get_value(),
+        self.recorder.set_channel(self.rx_freq.get_value(), self.w_tone.get_value())
+        await radios.broadcast(
+            "cmd_tune_to",
+            self.tx_freq.get_value(),
+            self.rx_freq.get_value(),
+            self.w_tone.get_value(),
+            self.w_squelch.get_value(),
+            self.w_bandwidth.get_value(),
         )
 
 
 class BandwidthWidget(ft.Row):
-    def __init__(self, client_storate):
+    def __init__(self, settings):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + "bandwidth"
-        self.client_storage = client_storate
-
-        if not self.client_storage.contains_key(self.key):
-            self.client_storage.set(self.key, "N")
+        self.settings = settings
 
         self.dd_bandwidth = ft.Dropdown(
-            value=self.client_storage.get(self.key),
+            value=self.settings.setdefault(self.key, "N"),
             options=[
                 ft.dropdown.Option("N", "Narrow"),
                 ft.dropdown.Option("W", "Wide"),
@@ -155,42 +222,32 @@ class BandwidthWidget(ft.Row):
     def handle_tone(self, e):
         logging.info("setting bandwidth: %d", int(self.dd_bandwidth.value))
 
-        self.client_storage.set(self.key, self.dd_bandwidth.value)
+        self.settings.set(self.key, self.dd_bandwidth.value)
 
-    async def get_value(self):
-        value = await self.client_storage.get_async(self.key)
-        return value
+    def get_value(self):
+        return self.settings.get(self.key)
 
 
 class FiltersWidget(ft.Row):
-    def __init__(self, client_storage):
+    def __init__(self, settings):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + "filters_"
-        self.client_storage = client_storage
-
-        if not self.client_storage.contains_key(self.key + "pre"):
-            self.client_storage.set(self.key + "pre", False)
-
-        if not self.client_storage.contains_key(self.key + "high"):
-            self.client_storage.set(self.key + "high", False)
-
-        if not self.client_storage.contains_key(self.key + "low"):
-            self.client_storage.set(self.key + "low", False)
+        self.settings = settings
 
         self.sw_pre = ft.Switch(
             "Pre",
-            value=self.client_storage.get(self.key + "pre"),
+            value=self.settings.setdefault(self.key + "pre", False),
             on_change=self.handle_filters,
         )
         self.sw_high = ft.Switch(
             "High",
-            value=self.client_storage.get(self.key + "high"),
+            value=self.settings.setdefault(self.key + "high", False),
             on_change=self.handle_filters,
         )
         self.sw_low = ft.Switch(
             "Low",
-            value=self.client_storage.get(self.key + "low"),
+            value=self.settings.setdefault(self.key + "low", False),
             on_change=self.handle_filters,
         )
 
@@ -202,9 +259,9 @@ class FiltersWidget(ft.Row):
         ]
 
     def get_filters(self):
-        pre = self.client_storage.get(self.key + "pre")
-        high = self.client_storage.get(self.key + "high")
-        low = self.client_storage.get(self.key + "low")
+        pre = self.settings.get(self.key + "pre")
+        high = self.settings.get(self.key + "high")
+        low = self.settings.get(self.key + "low")
 
         return {
             "pre": pre,
@@ -220,108 +277,61 @@ class FiltersWidget(ft.Row):
             self.sw_low.value,
         )
 
-        await self.client_storage.set_async(self.key + "pre", self.sw_pre.value)
-        await self.client_storage.set_async(self.key + "high", self.sw_high.value)
-        await self.client_storage.set_async(self.key + "low", self.sw_low.value)
+        self.settings.set(self.key + "pre", self.sw_pre.value)
+        self.settings.set(self.key + "high", self.sw_high.value)
+        self.settings.set(self.key + "low", self.sw_low.value)
 
-        await bleDevice.cmd_filters(
+        await radios.broadcast(
+            "cmd_filters",
             self.sw_pre.value,
             self.sw_high.value,
             self.sw_low.value,
         )
 
 
-ctcss_tone_list = [
-    67.0,
-    71.9,
-    74.4,
-    77.0,
-    79.7,
-    82.5,
-    85.4,
-    88.5,
-    91.5,
-    94.8,
-    97.4,
-    100.0,
-    103.5,
-    107.2,
-    110.9,
-    114.8,
-    118.8,
-    123.0,
-    127.3,
-    131.8,
-    136.5,
-    141.3,
-    146.2,
-    151.4,
-    156.7,
-    162.2,
-    167.9,
-    173.8,
-    179.9,
-    186.2,
-    192.8,
-    203.5,
-    210.7,
-    218.1,
-    225.7,
-    233.6,
-    241.8,
-    250.3,
-]
-
-
 class ToneWidget(ft.Row):
-    def __init__(self, client_storage):
+    def __init__(self, settings):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + "ctcss_tone"
-        self.client_storage = client_storage
-
-        if not self.client_storage.contains_key(self.key):
-            self.client_storage.set(self.key, 0)
+        self.settings = settings
 
         self.dd_tone = ft.Dropdown(
-            value=self.client_storage.get(self.key),
+            value=self.settings.setdefault(self.key, 0),
             options=[ft.dropdown.Option("0", "None")],
             width=100,
             on_change=self.handle_tone,
         )
 
-        for i, v in enumerate(ctcss_tone_list):
+        # Tone 0 is "None", so the first CTCSS tone is 1.
+        for i, v in enumerate(ctcss_tone_list, start=1):
             self.dd_tone.options.append(ft.dropdown.Option(f"{i:d}", f"{v:.1f} Mhz"))
 
-        self.dd_tone.value = self.client_storage.get(self.key)
+        self.dd_tone.value = self.settings.get(self.key)
 
         self.controls = [
             ft.Text("CTCSS Tone"),
             self.dd_tone,
         ]
 
-    async def get_value(self):
-        value = await self.client_storage.get_async(self.key)
-        return int(value)
+    def get_value(self):
+        return int(self.settings.get(self.key))
 
     def handle_tone(self, e):
         logging.info("setting tone: %d", int(self.dd_tone.value))
 
-        self.client_storage.set(self.key, self.dd_tone.value)
+        self.settings.set(self.key, self.dd_tone.value)
 
 
 class SquelchWidget(ft.Row):
-    def __init__(self, client_storage):
+    def __init__(self, settings):
         super().__init__()
 
         self.key = SETTINGS_KEY_PREFIX + "gain"
-        self.client_storage = client_storage
-
-        if not self.client_storage.contains_key(self.key):
-            self.client_storage.set(self.key, 4)
+        self.settings = settings
 
         self.dd_squelch = ft.Dropdown(
-            value=self.client_storage.get(self.key),
+            value=self.settings.setdefault(self.key, 4),
             options=[],
             width=100,
             on_change=self.handle_squelch,
@@ -330,21 +340,20 @@ class SquelchWidget(ft.Row):
         for x in range(1, 9):
             self.dd_squelch.options.append(ft.dropdown.Option(f"{x:d}"))
 
-        self.dd_squelch.value = self.client_storage.get(self.key)
+        self.dd_squelch.value = self.settings.get(self.key)
 
         self.controls = [
             ft.Text("Gain"),
             self.dd_squelch,
         ]
 
-    async def get_value(self):
-        value = await self.client_storage.get_async(self.key)
-        return value
+    def get_value(self):
+        return self.settings.get(self.key)
 
     def handle_squelch(self, e):
         logging.info("setting gain: %d", int(self.dd_squelch.value))
 
-        self.client_storage.set(self.key, self.dd_squelch.value)
+        self.settings.set(self.key, self.dd_squelch.value)
 
 
 class PTTWidget(ft.Row):
@@ -369,22 +378,87 @@ class PTTWidget(ft.Row):
 
     async def handle_ptt_down(self, e):
         logging.info("push-to-talk down")
-        await bleDevice.cmd_ptt_down()
+        await radios.broadcast("cmd_ptt_down")
 
     async def handle_ptt_up(self, e):
         logging.info("push-to-talk up")
-        await bleDevice.cmd_ptt_up()
+        await radios.broadcast("cmd_ptt_up")
 
     async def handle_stop(self, e):
         logging.info("stop")
-        await bleDevice.cmd_stop()
+        await radios.broadcast("cmd_stop")
+
+
+class SignalWidget(ft.Column):
+    def __init__(self, scheduler):
+        super().__init__()
+
+        self.scheduler = scheduler
+        self.mounted = False
+        self.pb_level = ft.ProgressBar(value=0)
+        # Hidden until the analyzer sends its first waterfall.
+        self.img_waterfall = ft.Image(
+            visible=False,
+            height=96,
+            fit=ft.ImageFit.FILL,
+            gapless_playback=True,
+        )
+
+        self.controls = [
+            ft.Text("Signal"),
+            self.pb_level,
+            self.img_waterfall,
+        ]
+
+    def did_mount(self):
+        self.mounted = True
+
+    def will_unmount(self):
+        self.mounted = False
+
+    def show(self, analyzer):
+        # Encoding the waterfall is only worth it while it is on screen.
+        if not self.mounted:
+            return
+        db = 20 * math.log10(max(analyzer.level, 1e-6))
+        self.pb_level.value = min(1.0, max(0.0, (db + 60) / 60))
+        self.img_waterfall.src_base64 = analyzer.waterfall_base64()
+        self.img_waterfall.visible = True
+        self.scheduler.request(self.pb_level, self.img_waterfall)
+
+
+class RecordWidget(ft.Row):
+    def __init__(self, settings, recorder):
+        super().__init__()
+
+        self.key = SETTINGS_KEY_PREFIX + "record"
+        self.settings = settings
+        self.recorder = recorder
+
+        self.sw_record = ft.Switch(
+            "Record",
+            value=self.settings.setdefault(self.key, False),
+            on_change=self.handle_record,
+        )
+        if self.sw_record.value:
+            self.recorder.start()
+
+        self.controls = [self.sw_record]
+
+    async def handle_record(self, e):
+        self.settings.set(self.key, self.sw_record.value)
+        if self.sw_record.value:
+            self.recorder.start()
+        else:
+            await self.recorder.stop()
 
 
 class SavePresetWidget(ft.Row):
-    def __init__(self, client_storage):
+    def __init__(self, settings, presets):
         super().__init__()
 
-        self.client_storage = client_storage
+        self.settings = settings
+        self.presets = presets
 
         self.txt_name = ft.TextField("", expand=True)
         self.btn_save = ft.Button(
@@ -402,122 +476,289 @@ class SavePresetWidget(ft.Row):
             ),
         ]
 
-    def handle_save_preset(self, e):
+    async def handle_save_preset(self, e):
         if self.txt_name.value == "":
             dlg = ft.AlertDialog(title=ft.Text("Preset name cannot be empty"))
             self.page.open(dlg)
+            return
 
-        keys = self.client_storage.get_keys(SETTINGS_KEY_PREFIX)
         preset = {}
-        for k in keys:
-            preset[k.replace(SETTINGS_KEY_PREFIX, "")] = self.client_storage.get(k)
+        for k, v in self.settings.items():
+            preset[k.replace(SETTINGS_KEY_PREFIX, "")] = v
 
         logging.info("saving preset: %s", preset)
-        self.client_storage.set(PRESETS_KEY_PREFIX + self.txt_name.value, preset)
+        await self.presets.put(self.txt_name.value, preset)
+
 
+class PresetsListWidget(ft.ListView):
+    """
+    Only builds cards for the presets scrolled into view, a page at a time,
+    and patches single rows when a preset is saved or deleted.
+    """
 
-class PresetsListWidget(ft.Column):
-    def __init__(self, client_storage):
+    page_size = 50
+
+    def __init__(self, presets):
         super().__init__()
 
-        self.client_storage = client_storage
+        self.presets = presets
+        self.expand = True
+        self.on_scroll = self.handle_scroll
+        self.on_scroll_interval = 100
+        self.mounted = False
 
+        # Stay subscribed while the view is cached off screen, so the rows
+        # are already current when it is shown again.
+        self.presets.listeners.append(self.handle_change)
         self.set_items()
 
-    def set_items(self):
-        self.controls.clear()
-
-        keys = self.client_storage.get_keys(PRESETS_KEY_PREFIX)
-        for k in keys:
-            preset = self.client_storage.get(k)
-
-            summary = ""
-            if preset["rx_tx_split"]:
-                summary += f"Rx: %s Mhz " % (preset["rx_freq"])
-                summary += f"Tx: %s Mhz " % (preset["tx_freq"])
-                summary += f"CTCSS: %s " % (preset["ctcss_tone"])
-            else:
-                summary += f"Rx: %s Mhz " % (preset["rx_freq"])
-                summary += f"Tx: %s Mhz " % (preset["rx_freq"])
-                summary += f"CTCSS: %s " % (preset["ctcss_tone"])
-
-            print(preset["rx_tx_split"])
-            self.controls.append(
-                ft.Card(
-                    content=ft.Container(
-                        content=ft.Column(
+    def did_mount(self):
+        self.mounted = True
+
+    def will_unmount(self):
+        self.mounted = False
+
+    def update(self):
+        if self.mounted:
+            super().update()
+
+    def set_items(self, count=page_size):
+        started = time.perf_counter()
+        self.controls = [self.build_card(k) for k in self.presets.names(0, count)]
+        logging.info(
+            "built %d of %d preset cards in %.1f ms",
+            len(self.controls),
+            len(self.presets),
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def build_card(self, name):
+        preset = self.presets.get(name)
+
+        summary = ""
+        if preset["rx_tx_split"]:
+            summary += f"Rx: %s Mhz " % (preset["rx_freq"])
+            summary += f"Tx: %s Mhz " % (preset["tx_freq"])
+            summary += f"CTCSS: %s " % (preset["ctcss_tone"])
+        else:
+            summary += f"Rx: %s Mhz " % (preset["rx_freq"])
+            summary += f"Tx: %s Mhz " % (preset["rx_freq"])
+            summary += f"CTCSS: %s " % (preset["ctcss_tone"])
+
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column(
+                    [
+                        ft.ListTile(
+                            title=ft.Text(name),
+                            subtitle=ft.Text(summary),
+                        ),
+                        ft.Row(
                             [
-                                ft.ListTile(
-                                    title=ft.Text(k.replace(PRESETS_KEY_PREFIX, "")),
-                                    subtitle=ft.Text(summary),
+                                ft.TextButton("Load"),
+                                ft.TextButton(
+                                    "Delete",
+                                    on_click=self.handle_delete,
+                                    data=name,
                                 ),
-                                ft.Row(
-                                    [
-                                        ft.TextButton("Load"),
-                                        ft.TextButton(
-                                            "Delete",
-                                            on_click=self.handle_delete,
-                                            data=k,
-                                        ),
-                                    ],
-                                    alignment=ft.MainAxisAlignment.END,
-                                ),
-                            ]
+                            ],
+                            alignment=ft.MainAxisAlignment.END,
                         ),
-                        expand=True,
-                    )
-                )
-            )
+                    ]
+                ),
+                expand=True,
+            ),
+            data=name,
+        )
 
-    def handle_delete(self, e):
-        self.client_storage.remove(e.control.data)
-        self.set_items()
+    def handle_scroll(self, e):
+        built = len(self.controls)
+        if built >= len(self.presets) or e.pixels < e.max_scroll_extent - 500:
+            return
+        names = self.presets.names(built, built + self.page_size)
+        self.controls.extend(self.build_card(k) for k in names)
+        self.update()
+
+    def handle_change(self, name):
+        if name is None:
+            self.set_items(max(len(self.controls), self.page_size))
+            self.update()
+            return
+
+        # Cards are built for a prefix of the sorted names, so the name's
+        # position in the store is also its row.
+        pos = self.presets.position(name)
+        built = len(self.controls)
+        exists = pos < built and self.controls[pos].data == name
+        if name not in self.presets:
+            if exists:
+                del self.controls[pos]
+        elif exists:
+            self.controls[pos] = self.build_card(name)
+        elif pos < built or built == len(self.presets) - 1:
+            self.controls.insert(pos, self.build_card(name))
+        else:
+            return
         self.update()
 
+    async def handle_delete(self, e):
+        await self.presets.remove(e.control.data)
+
 
 def main(page):
+    global bleDevice, radios
+    if bleDevice is None:
+        bleDevice = Kv4pHTDevice()
+        radios = DeviceManager()
+        radios.add(bleDevice)
+
     page.adaptive = True
+    settings = SettingsStore(page, SETTINGS_KEY_PREFIX)
+    presets = PresetStore(page.client_storage, PRESETS_KEY_PREFIX)
+    recorder = Recorder(bleDevice, RECORDINGS_DIR)
+    scheduler = UiScheduler(page)
+    page.run_task(scheduler.run)
+
+    async def run_analyzer(on_update):
+        # Importing the analysis pulls in numpy, so it happens after the
+        # first frame instead of at startup.
+        from analysis import SignalAnalyzer
+
+        analyzer = SignalAnalyzer()
+        analyzer.attach(bleDevice)
+        await analyzer.run(on_update)
+
+    async def load_presets():
+        await presets.load()
+        mark_startup("interactive")
+
+    page.run_task(load_presets)
+
+    # Write back pending settings before the window goes away.
+    page.window.prevent_close = True
+
+    async def handle_window_event(e):
+        if e.type != ft.WindowEventType.CLOSE:
+            return
+        # A failure here must never keep the window from closing.
+        try:
+            await settings.close()
+        except Exception:
+            logging.exception("failed to save settings on close")
+        try:
+            await recorder.stop()
+        except Exception:
+            logging.exception("failed to stop the recorder on close")
+        finally:
+            page.window.destroy()
+
+    page.window.on_event = handle_window_event
+
+    # Try the last connected radio first instead of scanning for one.
+    if page.client_storage.contains_key(DEVICE_ADDRESS_KEY):
+        bleDevice.address = page.client_storage.get(DEVICE_ADDRESS_KEY)
 
     async def handle_connect(e):
-        await bleDevice.connect()
-        btn_connect.text = "Disconnect"
+        if btn_connect.text == "Disconnect":
+            await bleDevice.disconnect()
+            btn_connect.text = "Connect"
+        elif await bleDevice.connect():
+            await page.client_storage.set_async(DEVICE_ADDRESS_KEY, bleDevice.address)
+            btn_connect.text = "Disconnect"
+        radios.notify()
         page.update()
 
     btn_connect = ft.Button("Connect", on_click=handle_connect)
     page.appbar = ft.AppBar(
         title=ft.Text("kv4p HT"),
-        actions=[btn_connect],
+        actions=[RadiosMenu(radios), btn_connect],
     )
 
     def talk_view():
+        signal = SignalWidget(scheduler)
+        page.run_task(run_analyzer, signal.show)
         return ft.SafeArea(
             ft.Column(
                 [
-                    TuningWidget(page.client_storage),
-                    FiltersWidget(page.client_storage),
+                    signal,
+                    TuningWidget(settings, recorder),
+                    FiltersWidget(settings),
                     PTTWidget(),
-                    SavePresetWidget(page.client_storage),
+                    RecordWidget(settings, recorder),
+                    SavePresetWidget(settings, presets),
                 ],
                 scroll=ft.ScrollMode.AUTO,
             ),
             expand=True,
         )
 
+    async def handle_import(e: ft.FilePickerResultEvent):
+        if not e.files:
+            return
+        report = await import_chirp(e.files[0].path, presets)
+        page.open(
+            ft.SnackBar(
+                ft.Text(
+                    f"Imported {report.imported} presets, rejected {report.rejected}"
+                )
+            )
+        )
+
+    def handle_export(e: ft.FilePickerResultEvent):
+        if e.path:
+            export_chirp(e.path, presets)
+
+    import_picker = ft.FilePicker(on_result=handle_import)
+    export_picker = ft.FilePicker(on_result=handle_export)
+    page.overlay.extend([import_picker, export_picker])
+
     def presets_view():
         return ft.SafeArea(
-            PresetsListWidget(page.client_storage),
+            ft.Column(
+                [
+                    ft.Row(
+                        [
+                            ft.TextButton(
+                                "Import CSV",
+                                icon=ft.Icons.FILE_OPEN,
+                                on_click=lambda _: import_picker.pick_files(
+                                    allowed_extensions=["csv"]
+                                ),
+                            ),
+                            ft.TextButton(
+                                "Export CSV",
+                                icon=ft.Icons.SAVE,
+                                on_click=lambda _: export_picker.save_file(
+                                    file_name="kv4p-presets.csv",
+                                    allowed_extensions=["csv"],
+                                ),
+                            ),
+                        ],
+                        alignment=ft.MainAxisAlignment.END,
+                    ),
+                    PresetsListWidget(presets),
+                ],
+                expand=True,
+            ),
             expand=True,
         )
 
+    # Views are built on first use and then kept, so switching tabs only
+    # swaps controls.
+    views = {}
+    view_builders = [talk_view, presets_view, lambda: ft.Text("Settings!")]
+
+    def get_view(index):
+        if index not in views:
+            views[index] = view_builders[index]()
+        return views[index]
+
     def handle_nav_change(e):
-        if e.control.selected_index == 0:
-            page.controls = [talk_view()]
-        elif e.control.selected_index == 1:
+        if e.control.selected_index == 1:
             page.title = "Presets"
-            page.controls = [presets_view()]
         elif e.control.selected_index == 2:
             page.title = "Settings!"
-            page.controls = [ft.Text("Settings!")]
+        page.controls = [get_view(e.control.selected_index)]
         page.update()
 
     page.navigation_bar = ft.NavigationBar(
@@ -537,7 +778,8 @@ def main(page):
         on_change=handle_nav_change,
     )
 
-    page.add(talk_view())
+    page.add(get_view(0))
+    mark_startup("first_frame")
 
 
 logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+
+from kv4p import BleakTransport, Kv4pHTDevice, match_nus_uuid
+
+
+class DeviceManager:
+    """
+    Every radio the app controls. ``discover()`` finds all kv4p radios in one
+    shared scan; each device then connects and runs its own writer task and
+    RX pipeline on the same loop, independent of the others. Commands from
+    the UI go to the selected radios through ``broadcast()``.
+
+    *transport_factory(address)* creates transports for ``create()``, e.g.
+    ``lambda address: SimulatedTransport(address=address)``.
+    """
+
+    def __init__(self, transport_factory=None):
+        self.transport_factory = transport_factory
+        self.devices = []
+        self.selected = set()
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def notify(self):
+        for listener in list(self.listeners):
+            listener(self)
+
+    def find(self, address: str):
+        # Platforms disagree on the case of BLE addresses.
+        address = address.upper()
+        for device in self.devices:
+            transport_address = getattr(device.transport, "address", None)
+            for known in (device.address, transport_address):
+                if known is not None and known.upper() == address:
+                    return device
+        return None
+
+    def unbound(self):
+        """
+        A device that has neither an address nor a connection yet, which
+        would connect to whichever radio its own scan finds first.
+        """
+        for device in self.devices:
+            if (
+                device.address is None
+                and not device.connected
+                and not device.connect_lock.locked()
+            ):
+                return device
+        return None
+
+    def add(self, device: Kv4pHTDevice, selected=True) -> Kv4pHTDevice:
+        if device not in self.devices:
+            self.devices.append(device)
+        if selected:
+            self.selected.add(device)
+        self.notify()
+        return device
+
+    def create(self, address: str, transport=None, selected=True) -> Kv4pHTDevice:
+        if transport is None and self.transport_factory is not None:
+            transport = self.transport_factory(address)
+        return self.add(Kv4pHTDevice(transport, address), selected)
+
+    async def remove(self, device: Kv4pHTDevice):
+        self.devices.remove(device)
+        self.selected.discard(device)
+        await device.disconnect()
+        self.notify()
+
+    def select(self, device: Kv4pHTDevice, selected=True):
+        if selected:
+            self.selected.add(device)
+        else:
+            self.selected.discard(device)
+        self.notify()
+
+    @property
+    def selection(self):
+        return [device for device in self.devices if device in self.selected]
+
+    async def discover(self, timeout=5.0):
+        """
+        Scans once for *timeout* seconds and adds every radio advertising
+        the UART service that is not known yet. A radio known by address,
+        connected or restored from storage, is skipped. The first new one
+        is bound to a device without an address, if there is one, so that
+        device does not later connect to the same radio a second time.
+        Returns the new devices.
+        """
+        from bleak import BleakScanner
+
+        found = await BleakScanner.discover(timeout=timeout, return_adv=True)
+        added = []
+        for address, (ble_device, adv) in found.items():
+            if not match_nus_uuid(ble_device, adv) or self.find(address):
+                continue
+            transport = BleakTransport(address, ble_device=ble_device)
+            device = self.unbound()
+            if device is None:
+                device = self.create(address, transport, selected=False)
+            else:
+                device.address = address
+                device.transport = transport
+            added.append(device)
+        logging.info("found %d new radios", len(added))
+        return added
+
+    async def connect_all(self, devices=None):
+        """
+        Connects every radio in *devices* (default all) that is not
+        connected, all at once. Returns the devices that failed.
+        """
+        if devices is None:
+            devices = self.devices
+        pending = [device for device in devices if not device.connected]
+        results = await asyncio.gather(
+            *(device.connect() for device in pending), return_exceptions=True
+        )
+        failed = []
+        for device, result in zip(pending, results):
+            if result is not True:
+                logging.warning("could not connect to %s: %s", device.address, result)
+                failed.append(device)
+        self.notify()
+        return failed
+
+    async def disconnect_all(self):
+        await asyncio.gather(*(device.disconnect() for device in self.devices))
+        self.notify()
+
+    async def broadcast(self, method: str, *args):
+        """
+        Calls ``device.<method>(*args)`` on every selected radio
+        concurrently, e.g. ``broadcast("cmd_ptt_down")``.
+        """
+        return await asyncio.gather(
+            *(getattr(device, method)(*args) for device in self.selection)
+        )
+
+    def stats(self) -> list:
+        return [
+            {
+                "address": device.address,
+                "connected": device.connected,
+                "selected": device in self.selected,
+                "queue_depth": device.queue_depth,
+                "rx_overruns": device.rx_audio.overruns,
+            }
+            for device in self.devices
+        ]
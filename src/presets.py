@@ -0,0 +1,111 @@
+import asyncio
+import bisect
+import logging
+import time
+
+from kv4p import check_frequency_range
+
+
+class PresetStore:
+    """
+    Every preset under *prefix* held in memory, indexed by name (kept in
+    sorted order), band and RX frequency. Changes are written through to
+    client storage and reported to listeners as ``listener(name)``, or
+    ``listener(None)`` when everything changed.
+    """
+
+    def __init__(self, client_storage, prefix: str):
+        self.client_storage = client_storage
+        self.prefix = prefix
+        self.listeners = []
+        self.clear()
+
+    def clear(self):
+        self.presets = {}
+        self.order = []
+        self.by_band = {}
+        self.by_freq = []
+
+    def __len__(self):
+        return len(self.presets)
+
+    def __contains__(self, name):
+        return name in self.presets
+
+    async def load(self):
+        started = time.perf_counter()
+        keys = await self.client_storage.get_keys_async(self.prefix)
+        values = await asyncio.gather(*(self.client_storage.get_async(k) for k in keys))
+        self.clear()
+        for key, preset in zip(keys, values):
+            if isinstance(preset, dict):
+                self.index(key[len(self.prefix) :], preset)
+        logging.info(
+            "loaded %d presets in %.0f ms",
+            len(self.presets),
+            (time.perf_counter() - started) * 1000,
+        )
+        self.notify(None)
+
+    def index(self, name: str, preset: dict):
+        self.unindex(name)
+        self.presets[name] = preset
+        bisect.insort(self.order, name)
+        freq = float(preset.get("rx_freq", 0))
+        self.by_band.setdefault(check_frequency_range(freq), set()).add(name)
+        bisect.insort(self.by_freq, (freq, name))
+
+    def unindex(self, name: str):
+        preset = self.presets.pop(name, None)
+        if preset is None:
+            return
+        del self.order[bisect.bisect_left(self.order, name)]
+        freq = float(preset.get("rx_freq", 0))
+        self.by_band[check_frequency_range(freq)].discard(name)
+        del self.by_freq[bisect.bisect_left(self.by_freq, (freq, name))]
+
+    def get(self, name: str):
+        return self.presets.get(name)
+
+    def position(self, name: str) -> int:
+        return bisect.bisect_left(self.order, name)
+
+    def names(self, start=0, stop=None):
+        return self.order[start:stop]
+
+    def in_band(self, band: str):
+        return sorted(self.by_band.get(band, ()))
+
+    def in_range(self, low: float, high: float):
+        start = bisect.bisect_left(self.by_freq, (low, ""))
+        stop = bisect.bisect_right(self.by_freq, (high, "\uffff"))
+        return [name for _, name in self.by_freq[start:stop]]
+
+    def notify(self, name):
+        for listener in list(self.listeners):
+            listener(name)
+
+    async def put(self, name: str, preset: dict):
+        self.index(name, preset)
+        await self.client_storage.set_async(self.prefix + name, preset)
+        self.notify(name)
+
+    async def put_many(self, items, batch_size=500):
+        """
+        Adds (name, preset) pairs, writing them to client storage in
+        concurrent batches of *batch_size*.
+        """
+        batch = []
+        for name, preset in items:
+            self.index(name, preset)
+            batch.append(self.client_storage.set_async(self.prefix + name, preset))
+            if len(batch) >= batch_size:
+                await asyncio.gather(*batch)
+                batch.clear()
+        await asyncio.gather(*batch)
+        self.notify(None)
+
+    async def remove(self, name: str):
+        self.unindex(name)
+        await self.client_storage.remove_async(self.prefix + name)
+        self.notify(name)
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import wave
+
+from kv4p import AUDIO_SAMPLE_RATE, FRAME_AUDIO, ctcss_tone_list
+from scanner import frame_level
+
+# Messages from the loop to the writer thread.
+OPEN, DATA, CLOSE, STOP = range(4)
+
+
+class RecorderStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.frames = 0
+        self.dropped_frames = 0
+        self.segments = 0
+        self.files = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.errors = 0
+
+    @property
+    def bytes_per_sec(self) -> float:
+        elapsed = time.monotonic() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.bytes_written / elapsed
+
+    @property
+    def write_bytes_per_sec(self) -> float:
+        """
+        Throughput of the writes themselves, how far ahead of real time the
+        disk is.
+        """
+        if self.write_time <= 0:
+            return 0.0
+        return self.bytes_written / self.write_time
+
+
+class Recorder:
+    """
+    Records RX audio to *directory*, one WAV file per transmission. A
+    transmission starts when a frame's level reaches *threshold* and ends
+    once the level has stayed below it for *hangtime* seconds, or after
+    *max_segment* seconds so a stuck carrier cannot grow a file forever.
+    Each WAV gets a JSON sidecar with the frequency, tone and timestamps.
+
+    Frames are copied into a queue of at most *queue_size* entries and
+    written by a background thread, so the loop never waits on the disk.
+    Frames that do not fit in the queue are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        device,
+        directory: str,
+        threshold=8.0,
+        hangtime=1.5,
+        max_segment=600.0,
+        queue_size=512,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+    ):
+        self.device = device
+        self.directory = directory
+        self.threshold = threshold
+        self.hangtime = hangtime
+        self.max_segment = max_segment
+        self.sample_rate = sample_rate
+        self.queue = queue.Queue(queue_size)
+        self.thread = None
+        self.stats = RecorderStats()
+        self.rx_freq = None
+        self.tone = 0
+        self.segment_started = None
+        self.last_active = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None
+
+    @property
+    def recording(self) -> bool:
+        return self.segment_started is not None
+
+    def set_channel(self, rx_freq: float, tone: int):
+        """
+        Tags recordings started from now on. A retune ends the current one.
+        """
+        if (rx_freq, tone) != (self.rx_freq, self.tone):
+            self.end_segment()
+        self.rx_freq = rx_freq
+        self.tone = tone
+
+    def start(self):
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.stats.reset()
+        self.thread = threading.Thread(
+            target=self.write_segments, name="kv4p-recorder", daemon=True
+        )
+        self.thread.start()
+        self.device.parser.add_handler(FRAME_AUDIO, self.handle_audio)
+        logging.info("recording to %s", self.directory)
+
+    async def stop(self):
+        if not self.running:
+            return
+        self.device.parser.remove_handler(FRAME_AUDIO, self.handle_audio)
+        self.end_segment()
+        # STOP must get through even when the queue is full.
+        thread, self.thread = self.thread, None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.queue.put, (STOP, None))
+        await loop.run_in_executor(None, thread.join)
+        logging.info(
+            "recorded %d segments, %d bytes, dropped %d frames",
+            self.stats.segments,
+            self.stats.bytes_written,
+            self.stats.dropped_frames,
+        )
+
+    def handle_audio(self, payload: memoryview):
+        self.stats.frames += 1
+        now = time.time()
+        active = frame_level(payload) >= self.threshold
+
+        if self.segment_started is None:
+            if not active:
+                return
+            self.start_segment(now)
+        elif active:
+            self.last_active = now
+        elif now - self.last_active > self.hangtime:
+            self.end_segment()
+            return
+
+        # The payload is only valid during this call.
+        self.send(DATA, bytes(payload))
+
+        if now - self.segment_started >= self.max_segment:
+            self.end_segment()
+
+    def start_segment(self, now: float):
+        self.segment_started = self.last_active = now
+        self.stats.segments += 1
+        tags = {
+            "rx_freq": self.rx_freq,
+            "tone": self.tone,
+            "tone_hz": (
+                ctcss_tone_list[self.tone - 1]
+                if 0 < self.tone <= len(ctcss_tone_list)
+                else None
+            ),
+            "sample_rate": self.sample_rate,
+            "started": now,
+        }
+        self.send(OPEN, tags)
+
+    def end_segment(self):
+        if self.segment_started is None:
+            return
+        self.segment_started = self.last_active = None
+        self.send(CLOSE, time.time())
+
+    def send(self, kind, value):
+        try:
+            self.queue.put_nowait((kind, value))
+        except queue.Full:
+            # A lost OPEN or CLOSE is recovered by the writer, the frames
+            # are just gone.
+            self.stats.dropped_frames += kind == DATA
+
+    def segment_path(self, tags: dict) -> str:
+        started = tags["started"]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        millis = int(started * 1000) % 1000
+        freq = f"-{tags['rx_freq']:.4f}" if tags["rx_freq"] else ""
+        return os.path.join(self.directory, f"{stamp}.{millis:03d}{freq}.wav")
+
+    def write_segments(self):
+        """
+        Writer thread: drains the queue into WAV files until STOP.
+        """
+        f = w = tags = None
+        stats = self.stats
+        while True:
+            kind, value = self.queue.get()
+            try:
+                if kind == DATA:
+                    if w is None:
+                        stats.dropped_frames += 1
+                        continue
+                    started = time.perf_counter()
+                    w.writeframesraw(value)
+                    stats.write_time += time.perf_counter() - started
+                    stats.bytes_written += len(value)
+                    continue
+
+                if w is not None:
+                    self.finish(f, w, tags, value if kind == CLOSE else time.time())
+                    f = w = tags = None
+                if kind == OPEN:
+                    tags = value
+                    tags["path"] = self.segment_path(tags)
+                    f = open(tags["path"], "wb", buffering=1 << 16)
+                    w = wave.open(f, "wb")
+                    w.setnchannels(1)
+                    w.setsampwidth(1)
+                    w.setframerate(self.sample_rate)
+                elif kind == STOP:
+                    return
+            except OSError:
+                stats.errors += 1
+                logging.exception("recorder write failed")
+                if f is not None:
+                    f.close()
+                f = w = tags = None
+
+    def finish(self, f, w, tags, ended: float):
+        # writeframesraw leaves the header for close() to patch once.
+        samples = w.getnframes()
+        w.close()
+        f.close()
+        tags["ended"] = ended
+        tags["duration"] = samples / self.sample_rate
+        path = tags.pop("path")
+        with open(os.path.splitext(path)[0] + ".json", "w") as sidecar:
+            json.dump(tags, sidecar, indent=2)
+        self.stats.files += 1
@@ -0,0 +1,234 @@
+import asyncio
+import itertools
+import logging
+
+from kv4p import CMD_TUNE_TO, FRAME_AUDIO, check_frequency_range, encode_tune_to
+
+# |x - 128| for every 8-bit unsigned sample, so the energy of a frame is one
+# translate and one sum.
+MAGNITUDE_TABLE = bytes(abs(x - 128) for x in range(256))
+
+
+def frame_level(payload) -> float:
+    """
+    Mean absolute deviation from silence of an 8-bit unsigned PCM frame.
+    """
+    if not payload:
+        return 0.0
+    return sum(bytes(payload).translate(MAGNITUDE_TABLE)) / len(payload)
+
+
+class Channel:
+    def __init__(
+        self, rx_freq, tx_freq=None, tone=0, squelch=4, bandwidth="N", name=""
+    ):
+        self.rx_freq = rx_freq
+        self.tx_freq = rx_freq if tx_freq is None else tx_freq
+        self.tone = tone
+        self.squelch = squelch
+        self.bandwidth = bandwidth
+        self.name = name
+
+    def __repr__(self):
+        return f"Channel({self.name or self.rx_freq!r})"
+
+    def encode(self) -> bytes:
+        return encode_tune_to(
+            self.tx_freq, self.rx_freq, self.tone, self.squelch, self.bandwidth
+        )
+
+
+def channels_from_range(start, stop, step, tone=0, squelch=4, bandwidth="N"):
+    """
+    Channels from *start* to *stop* inclusive every *step* MHz, skipping
+    frequencies outside the VHF and UHF bands.
+    """
+    # Step by index so rounding errors do not accumulate over a long sweep.
+    n = int(round((stop - start) / step))
+    channels = []
+    for i in range(n + 1):
+        freq = round(start + i * step, 4)
+        if check_frequency_range(freq):
+            channels.append(
+                Channel(freq, tone=tone, squelch=squelch, bandwidth=bandwidth)
+            )
+    return channels
+
+
+def channels_from_presets(presets):
+    """
+    Channels from saved presets, given as (name, preset) pairs in the format
+    written by the app.
+    """
+    channels = []
+    for name, preset in presets:
+        rx_freq = float(preset["rx_freq"])
+        tx_freq = float(preset["tx_freq"]) if preset.get("rx_tx_split") else rx_freq
+        if not check_frequency_range(rx_freq):
+            continue
+        channels.append(
+            Channel(
+                rx_freq,
+                tx_freq,
+                int(preset.get("ctcss_tone", 0)),
+                int(preset.get("gain", 4)),
+                preset.get("bandwidth", "N"),
+                name,
+            )
+        )
+    return channels
+
+
+class ScanStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.channels = 0
+        self.elapsed = 0.0
+        self.dwell_total = 0.0
+        self.dwell_times = {}
+
+    @property
+    def channels_per_sec(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.channels / self.elapsed
+
+    @property
+    def mean_dwell(self) -> float:
+        if not self.channels:
+            return 0.0
+        return self.dwell_total / self.channels
+
+
+class Scanner:
+    """
+    Sweeps a list of channels on *device*, listening *dwell* seconds on each
+    and stopping on the first channel whose RX audio rises above *threshold*.
+    The dwell on a channel starts once its retune has been written, and the
+    next retune is queued ahead of the end of the dwell by the time writes
+    have been taking, so it lands as the dwell runs out. Audio arriving
+    within *settle* seconds of a retune is ignored, it may still belong to
+    the previous channel.
+    """
+
+    def __init__(self, device, dwell=0.1, threshold=8.0, settle=0.02):
+        self.device = device
+        self.dwell = dwell
+        self.threshold = threshold
+        self.settle = settle
+        self.stats = ScanStats()
+        self.active = asyncio.Event()
+        self.listen_after = None
+        self.next_sent = None
+
+    def handle_audio(self, payload: memoryview):
+        if self.listen_after is None or self.active.is_set():
+            return
+        if self.next_sent is not None and self.next_sent.done():
+            # Already retuned, this belongs to the next channel.
+            return
+        if asyncio.get_running_loop().time() < self.listen_after:
+            return
+        if frame_level(payload) >= self.threshold:
+            self.active.set()
+
+    def tune(self, packet: bytes) -> asyncio.Future:
+        sent = asyncio.get_running_loop().create_future()
+        self.device.queue_command(packet, key=CMD_TUNE_TO, sent=sent)
+        return sent
+
+    async def listen(self, deadline: float) -> bool:
+        timeout = max(0.0, deadline - asyncio.get_running_loop().time())
+        try:
+            await asyncio.wait_for(self.active.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.active.is_set()
+
+    async def listen_until_sent(self, sent: asyncio.Future) -> bool:
+        waiter = asyncio.ensure_future(self.active.wait())
+        try:
+            await asyncio.wait((waiter, sent), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        return self.active.is_set()
+
+    async def scan(self, channels, repeat=True):
+        """
+        Scans *channels* until one shows activity and returns it, leaving the
+        radio tuned there. Returns None after one pass if *repeat* is false.
+        Only channels whose retune was written count in the stats.
+        """
+        # Encode every retune up front, so moving on is just queueing bytes.
+        packets = [ch.encode() for ch in channels]
+        if not packets:
+            return None
+        order = (
+            itertools.cycle(range(len(packets)))
+            if repeat
+            else iter(range(len(packets)))
+        )
+
+        loop = asyncio.get_running_loop()
+        stats = self.stats
+        stats.reset()
+        started = loop.time()
+        write_time = 0.0
+        self.device.parser.add_handler(FRAME_AUDIO, self.handle_audio)
+        try:
+            index = next(order)
+            queued = loop.time()
+            sent = self.tune(packets[index])
+            while True:
+                current = index
+                channel = channels[current]
+                written = await sent
+                tuned = loop.time()
+                index = next(order, None)
+                if not written:
+                    # Replaced or dropped, the radio never went there.
+                    if index is None:
+                        return None
+                    queued = tuned
+                    sent = self.tune(packets[index])
+                    continue
+
+                write_time = tuned - queued
+                self.active.clear()
+                self.next_sent = None
+                self.listen_after = tuned + self.settle
+                # Leave time for the next retune to be written by the end of
+                # the dwell, the radio stays here until it is.
+                lead = min(write_time, self.dwell) if index is not None else 0.0
+                found = await self.listen(tuned + self.dwell - lead)
+                if not found and index is not None:
+                    queued = loop.time()
+                    sent = self.next_sent = self.tune(packets[index])
+                    found = await self.listen_until_sent(sent)
+
+                now = loop.time()
+                stats.channels += 1
+                stats.dwell_total += now - tuned
+                stats.dwell_times[channel.rx_freq] = now - tuned
+                stats.elapsed = now - started
+
+                if found:
+                    if self.next_sent is not None:
+                        # Take back or undo the retune already queued.
+                        self.device.queue_command(packets[current], key=CMD_TUNE_TO)
+                    logging.info("activity on %s", channel)
+                    return channel
+                if index is None:
+                    return None
+        finally:
+            self.listen_after = None
+            self.next_sent = None
+            self.device.parser.remove_handler(FRAME_AUDIO, self.handle_audio)
+            logging.info(
+                "scanned %d channels at %.1f channels/s, mean dwell %.3fs",
+                stats.channels,
+                stats.channels_per_sec,
+                stats.mean_dwell,
+            )
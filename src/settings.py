@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+
+class SettingsStore:
+    """
+    In-memory copy of every client storage key under *prefix*. Reads never
+    touch client storage; writes mark the key dirty and dirty keys are
+    written back together every *flush_interval* seconds and on ``close()``.
+    """
+
+    def __init__(self, page, prefix: str, flush_interval=2.0):
+        self.page = page
+        self.client_storage = page.client_storage
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.values = {}
+        self.dirty = set()
+        self.flushes = 0
+        self.load()
+        page.run_task(self.flush_periodically)
+
+    def load(self):
+        # Client storage has no bulk get, so this is the only place that
+        # reads key by key.
+        for key in self.client_storage.get_keys(self.prefix):
+            self.values[key] = self.client_storage.get(key)
+        logging.info("loaded %d settings", len(self.values))
+
+    def contains_key(self, key: str) -> bool:
+        return key in self.values
+
+    def get(self, key: str, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key: str, value):
+        if key in self.values and self.values[key] == value:
+            return
+        self.values[key] = value
+        self.dirty.add(key)
+
+    def setdefault(self, key: str, default):
+        if key not in self.values:
+            self.set(key, default)
+        return self.values[key]
+
+    def items(self):
+        return self.values.items()
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        try:
+            await asyncio.gather(
+                *(self.client_storage.set_async(k, self.values[k]) for k in dirty)
+            )
+        except Exception:
+            self.dirty |= dirty
+            raise
+        self.flushes += 1
+        logging.debug("flushed %d settings", len(dirty))
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("failed to flush settings")
+
+    async def close(self):
+        await self.flush()
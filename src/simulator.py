@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import math
+import random
+
+from kv4p import (
+    AUDIO_SAMPLE_RATE,
+    CMD_FILTERS,
+    CMD_GET_FIRMWARE_VER,
+    CMD_PTT_DOWN,
+    CMD_PTT_UP,
+    CMD_STOP,
+    CMD_TUNE_TO,
+    COMMAND_HEADER,
+    FRAME_AUDIO,
+    FRAME_FIRMWARE_VERSION,
+    FRAME_HEADER,
+    UART_TX_CHAR_UUID,
+    Transport,
+)
+
+# Argument bytes following each command byte on the outbound stream.
+COMMAND_ARG_SIZES = {
+    CMD_PTT_DOWN: 0,
+    CMD_PTT_UP: 0,
+    CMD_TUNE_TO: 20,
+    CMD_FILTERS: 3,
+    CMD_STOP: 0,
+    CMD_GET_FIRMWARE_VER: 1,
+}
+
+# One period of a 1 kHz tone as 8-bit unsigned PCM at the audio sample rate.
+TONE_CYCLE = bytes(
+    128 + int(100 * math.sin(2 * math.pi * i * 1000 / AUDIO_SAMPLE_RATE))
+    for i in range(AUDIO_SAMPLE_RATE // 1000)
+)
+
+
+class SimulatedPeripheral:
+    """
+    In-process stand-in for a kv4p radio behind the NUS service. Decodes the
+    command stream written to ``UART_RX_CHAR_UUID``, keeps the resulting
+    radio state and, while attached, notifies framed RX audio on
+    ``UART_TX_CHAR_UUID`` at *notify_rate* notifications per second.
+    Frequencies in *active_frequencies* carry a tone, all others silence.
+    """
+
+    def __init__(
+        self,
+        notify_rate=50,
+        sample_rate=AUDIO_SAMPLE_RATE,
+        active_frequencies=(),
+        firmware_version="1.0.0",
+    ):
+        self.notify_rate = notify_rate
+        self.sample_rate = sample_rate
+        self.active_frequencies = set(active_frequencies)
+        self.firmware_version = firmware_version
+        self.on_notify = None
+        self.notify_size = 20
+        self.emitter = None
+        self.pending = bytearray()
+        self.reset()
+
+    def reset(self):
+        self.commands = []
+        self.tx_audio_bytes = 0
+        self.rx_audio_bytes = 0
+        self.notifications = 0
+        self.ptt = False
+        self.tuned = None
+        self.filters = None
+
+    def attach(self, on_notify, notify_size: int):
+        self.on_notify = on_notify
+        self.notify_size = notify_size
+        self.pending.clear()
+        if self.notify_rate:
+            self.emitter = asyncio.create_task(self.emit_audio())
+
+    def detach(self):
+        self.on_notify = None
+        if self.emitter is not None:
+            self.emitter.cancel()
+            self.emitter = None
+
+    def notify(self, data):
+        if self.on_notify is None:
+            return
+        for i in range(0, len(data), self.notify_size):
+            self.notifications += 1
+            self.on_notify(UART_TX_CHAR_UUID, bytearray(data[i : i + self.notify_size]))
+
+    def send_frame(self, frame_type: int, payload: bytes):
+        self.notify(
+            bytes(COMMAND_HEADER)
+            + FRAME_HEADER.pack(frame_type, len(payload))
+            + payload
+        )
+
+    def audio(self, n: int) -> bytes:
+        if self.tuned is None or self.tuned[1] not in self.active_frequencies:
+            return bytes([128]) * n
+        reps = n // len(TONE_CYCLE) + 1
+        return (TONE_CYCLE * reps)[:n]
+
+    async def emit_audio(self):
+        loop = asyncio.get_running_loop()
+        per_frame = self.sample_rate // self.notify_rate
+        start = loop.time()
+        frames = 0
+        while True:
+            frames += 1
+            await asyncio.sleep(max(0, start + frames / self.notify_rate - loop.time()))
+            self.rx_audio_bytes += per_frame
+            self.send_frame(FRAME_AUDIO, self.audio(per_frame))
+
+    def write(self, data):
+        """
+        Decodes bytes written to the RX characteristic. Anything that is not
+        part of a command counts as TX audio.
+        """
+        buf = self.pending
+        buf += data
+        pos = 0
+        while True:
+            start = buf.find(COMMAND_HEADER, pos)
+            if start < 0:
+                keep = max(pos, len(buf) - len(COMMAND_HEADER) + 1)
+                self.tx_audio_bytes += keep - pos
+                pos = keep
+                break
+            self.tx_audio_bytes += start - pos
+            args_at = start + len(COMMAND_HEADER) + 1
+            if args_at > len(buf):
+                pos = start
+                break
+            cmd = buf[args_at - 1]
+            size = COMMAND_ARG_SIZES.get(cmd)
+            if size is None:
+                logging.warning("simulator: unknown command %#x", cmd)
+                pos = args_at
+                continue
+            if args_at + size > len(buf):
+                pos = start
+                break
+            self.handle_command(cmd, bytes(buf[args_at : args_at + size]))
+            pos = args_at + size
+        del buf[:pos]
+
+    def handle_command(self, cmd: int, args: bytes):
+        self.commands.append((cmd, args))
+        if cmd == CMD_PTT_DOWN:
+            self.ptt = True
+        elif cmd in (CMD_PTT_UP, CMD_STOP):
+            self.ptt = False
+        elif cmd == CMD_TUNE_TO:
+            self.tuned = (
+                float(args[0:8]),
+                float(args[8:16]),
+                int(args[16:18]),
+                int(args[18:19]),
+                args[19:20].decode("ASCII"),
+            )
+        elif cmd == CMD_FILTERS:
+            self.filters = tuple(b == 0x31 for b in args)
+        elif cmd == CMD_GET_FIRMWARE_VER:
+            self.send_frame(
+                FRAME_FIRMWARE_VERSION, args + self.firmware_version.encode("ASCII")
+            )
+
+
+class SimulatedTransport(Transport):
+    """
+    Transport to a SimulatedPeripheral with a configurable MTU, per-write
+    latency, random jitter on top of it and a loss rate for writes without
+    response.
+    """
+
+    supports_response = True
+
+    def __init__(
+        self,
+        peripheral: SimulatedPeripheral = None,
+        mtu=247,
+        latency=0.0,
+        jitter=0.0,
+        loss=0.0,
+        seed=None,
+        address="simulated",
+    ):
+        self.peripheral = peripheral or SimulatedPeripheral()
+        self.mtu = mtu
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.device = self.address = address
+        self.connected = False
+        self.on_disconnect = None
+        self.writes = 0
+        self.lost_writes = 0
+
+    @property
+    def max_write_size(self) -> int:
+        # ATT header takes 3 bytes of the MTU.
+        return self.mtu - 3
+
+    async def connect(self, on_notify, on_disconnect) -> bool:
+        await self.delay()
+        self.on_disconnect = on_disconnect
+        self.connected = True
+        self.connected_via = "address"
+        self.peripheral.attach(on_notify, self.max_write_size)
+        return True
+
+    async def disconnect(self):
+        if self.connected:
+            self.drop()
+
+    def drop(self):
+        """
+        Simulates link loss.
+        """
+        self.connected = False
+        self.peripheral.detach()
+        self.on_disconnect(self)
+
+    async def delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        await asyncio.sleep(delay)
+
+    async def write(self, data, response: bool = False):
+        if not self.connected:
+            raise ConnectionError("simulated peripheral is not connected")
+        if len(data) > self.max_write_size:
+            raise ValueError("write exceeds MTU")
+
+        await self.delay()
+        self.writes += 1
+        if not response and self.loss and self.random.random() < self.loss:
+            self.lost_writes += 1
+            return
+        if response:
+            # The acknowledgement takes another trip across the link.
+            await self.delay()
+        self.peripheral.write(data)
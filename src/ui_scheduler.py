@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+
+class UiScheduler:
+    """
+    Batches control updates for telemetry that changes faster than the
+    screen. Controls passed to ``request()`` are collected and sent in one
+    ``page.update()`` per frame, at most *max_fps* frames a second; a control
+    requested several times within a frame is sent once. Controls that left
+    the page before their frame are skipped.
+    """
+
+    def __init__(self, page, max_fps=30):
+        self.page = page
+        self.max_fps = max_fps
+        # Keyed by id, controls compare by value.
+        self.dirty = {}
+        self.wakeup = asyncio.Event()
+        self.requested = 0
+        self.sent = 0
+        self.frames = 0
+
+    def request(self, *controls):
+        for control in controls:
+            self.dirty[id(control)] = control
+        self.requested += len(controls)
+        self.wakeup.set()
+
+    def flush(self):
+        controls = [c for c in self.dirty.values() if c.page is not None]
+        self.dirty.clear()
+        if not controls:
+            return
+        self.page.update(*controls)
+        self.sent += len(controls)
+        self.frames += 1
+
+    async def run(self):
+        interval = 1 / self.max_fps
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("failed to update controls")
+            # Whatever is requested meanwhile goes out in the next frame.
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "sent": self.sent,
+            "frames": self.frames,
+        }
@@ -0,0 +1,91 @@
+import pytest
+
+from kv4p import COMMAND_HEADER, FRAME_AUDIO, FRAME_HEADER, FrameParser
+
+HEADER = bytes(COMMAND_HEADER)
+
+
+def frame(payload: bytes, frame_type=FRAME_AUDIO) -> bytes:
+    return HEADER + FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+
+def header(length: int, frame_type=FRAME_AUDIO) -> bytes:
+    return HEADER + FRAME_HEADER.pack(frame_type, length)
+
+
+def parse(stream: bytes, step=None, max_payload=4096):
+    parser = FrameParser(max_payload)
+    payloads = []
+    parser.add_handler(FRAME_AUDIO, lambda payload: payloads.append(bytes(payload)))
+    step = step or len(stream)
+    for i in range(0, len(stream), step):
+        parser.feed(stream[i : i + step])
+    return parser, payloads
+
+
+# Garbage, a header with an impossible length, a header with a plausible but
+# bogus length, and frames split in every possible way.
+STREAM = (
+    b"garbage1234"
+    + frame(b"one")
+    + frame(b"two")
+    + b"zz"
+    + frame(b"three")
+    + header(60000)
+    + b"q"
+    + frame(b"four")
+    + header(100)
+    + frame(b"five")
+    + frame(bytes(range(256)) * 2)
+)
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 20, 244])
+def test_split_invariance(step):
+    whole, whole_payloads = parse(STREAM)
+    split, split_payloads = parse(STREAM, step)
+    assert split_payloads == whole_payloads
+    assert split.frames == whole.frames
+    assert split.garbage_bytes == whole.garbage_bytes
+    assert split.resyncs == whole.resyncs
+    assert len(split.buf) == len(whole.buf) == 0
+
+
+def test_stream_counts():
+    parser, payloads = parse(STREAM)
+    assert payloads == [b"one", b"two", b"three", b"four", b"five"] + [
+        bytes(range(256)) * 2
+    ]
+    assert parser.resyncs == 4
+
+
+def test_oversized_length_resyncs_on_next_header():
+    stream = header(5000) + b"\x00" * 5 + frame(b"real")
+    parser, payloads = parse(stream, max_payload=4096)
+    assert payloads == [b"real"]
+    assert parser.garbage_bytes == len(header(5000)) + 5
+    assert parser.resyncs == 1
+
+
+def test_bogus_length_does_not_hold_back_frames():
+    real = frame(b"abc")
+    parser, payloads = parse(header(100) + real + real + real[:2])
+    # Both complete frames come out at once, only the split one waits.
+    assert payloads == [b"abc", b"abc"]
+    assert bytes(parser.buf) == real[:2]
+    assert parser.garbage_bytes == len(header(100))
+    assert parser.resyncs == 1
+
+    parser.feed(real[2:])
+    assert payloads == [b"abc"] * 3
+    assert not parser.buf
+
+
+def test_frame_split_across_feeds_waits_for_the_rest():
+    data = frame(b"x" * 300)
+    parser, payloads = parse(data[:150])
+    assert payloads == []
+    parser.feed(data[150:])
+    assert payloads == [b"x" * 300]
+    assert parser.garbage_bytes == 0
+    assert parser.resyncs == 0